@@ -0,0 +1,176 @@
+"""Micro-benchmarks of the hot paths against a synthetic temp database.
+
+Results are written as JSON so runs on different commits can be compared:
+
+    python benchmark_hot_paths.py --points 100000 --wikis 5000 --output before.json
+    python benchmark_hot_paths.py --points 100000 --wikis 5000 --output after.json --compare before.json
+"""
+from flask import get_template_attribute
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from database import db
+from models import Wiki
+from synthetic_data import create_seeded_app, random_coordinates, write_water_level_csv, CATEGORIES
+from views import wiki_listing_query
+from water_level_data import WaterLevelData
+
+# Every combination of the search filters
+SEARCH_CASES = {
+    'search_all': '/search',
+    'search_category': '/search?category={category}',
+    'search_query': '/search?query={word}',
+    'search_location': '/search?use_location=true&latitude={lat}&longitude={lon}',
+    'search_category_query': '/search?category={category}&query={word}',
+    'search_category_location': '/search?category={category}&use_location=true&latitude={lat}&longitude={lon}',
+    'search_query_location': '/search?query={word}&use_location=true&latitude={lat}&longitude={lon}',
+    'search_category_query_location': '/search?category={category}&query={word}&use_location=true&latitude={lat}&longitude={lon}'
+}
+SEARCH_WORDS = ('rain', 'groundwater', 'drip irrigation', 'tank')
+# Slower than the baseline by more than this fraction is reported as a regression
+REGRESSION_THRESHOLD = 0.10
+
+def measure(func, repeat, number=1):
+    """Time ``repeat`` rounds of ``number`` calls; per-call milliseconds."""
+    func()  # Warm up caches and lazily built indexes
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - started) / number * 1000)
+    times.sort()
+    return {
+        'calls': repeat * number,
+        'min_ms': round(times[0], 4),
+        'median_ms': round(statistics.median(times), 4),
+        'p95_ms': round(times[min(len(times) - 1, int(len(times) * 0.95))], 4),
+        'mean_ms': round(statistics.fmean(times), 4)
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(directory, points, wikis, repeat, seed=0):
+    rng = random.Random(seed)
+    results = {}
+    app = create_seeded_app(directory, points=points, wikis=wikis, seed=seed, config={
+        # Measure rendering and queries, not cache hits
+        'FRAGMENT_CACHE_BACKEND': 'none'
+    })
+    coordinates = random_coordinates(rng, 1000)
+
+    with app.app_context():
+        nearest_calls = iter(coordinates * (repeat * 100))
+        results['find_nearest_point'] = measure(lambda: WaterLevelData.find_nearest_point(*next(nearest_calls)), repeat, 100)
+
+        batch = random_coordinates(rng, 100000)
+        batch_lats, batch_lons = [lat for lat, _ in batch], [lon for _, lon in batch]
+        results['find_nearest_wells_100k'] = measure(lambda: WaterLevelData.find_nearest_wells(batch_lats, batch_lons), repeat)
+
+        levels = [rng.uniform(0, 20) for _ in range(100000)]
+        results['get_scarcity_level_100k'] = measure(
+            lambda: [WaterLevelData.get_scarcity_level(level) for level in levels], repeat
+        )
+
+    # Macros need a request context for url_for
+    with app.test_request_context('/'):
+        rows = wiki_listing_query().order_by(Wiki.date_posted.desc()).limit(20).all()
+        wiki = Wiki.query.first()
+        wiki_list = get_template_attribute('_wiki_fragments.html', 'wiki_list')
+        wiki_body = get_template_attribute('_wiki_fragments.html', 'wiki_body')
+        results['render_wiki_list_20'] = measure(lambda: str(wiki_list(rows)), repeat, 10)
+        results['render_wiki_body'] = measure(lambda: str(wiki_body(wiki)), repeat, 10)
+        db.session.remove()
+
+    client = app.test_client()
+    for name, template in SEARCH_CASES.items():
+        def search(template=template):
+            lat, lon = rng.choice(coordinates)
+            url = template.format(category=rng.choice(CATEGORIES), word=rng.choice(SEARCH_WORDS), lat=lat, lon=lon)
+            response = client.get(url)
+            assert response.status_code in (200, 302), (url, response.status_code)
+        results[name] = measure(search, repeat, 5)
+    results['home'] = measure(lambda: client.get('/'), repeat, 5)
+
+    csv_path = write_water_level_csv(os.path.join(directory, 'points.csv'), points, seed=seed + 1)
+    with app.app_context():
+        from import_excel import import_excel_data
+        timings = []
+        for _ in range(max(1, repeat // 10)):
+            result = import_excel_data(csv_path)
+            assert result['success'], result
+            timings.append(result['rows_per_second'])
+        results['import_csv'] = {'rows': points, 'rows_per_second': round(statistics.median(timings), 1)}
+        db.session.remove()
+    return results
+
+def compare(results, baseline):
+    """Lines comparing median timings (or import throughput) with ``baseline``."""
+    lines = [f'{"benchmark":<34} {"baseline":>17} {"current":>17} {"change":>8}']
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if 'rows_per_second' in current:
+            old, new, unit = before['rows_per_second'], current['rows_per_second'], 'rows/s'
+            change = old / new - 1 if new else 0  # Positive means slower
+        else:
+            old, new, unit = before['median_ms'], current['median_ms'], 'ms'
+            change = new / old - 1 if old else 0
+        flag = '  REGRESSION' if change > REGRESSION_THRESHOLD else ''
+        digits = 0 if unit == 'rows/s' else 3
+        lines.append(f'{name:<34} {old:>10.{digits}f} {unit:<6} {new:>10.{digits}f} {unit:<6} {change:>+8.1%}{flag}')
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, default=50000, help='synthetic water level points')
+    parser.add_argument('--wikis', type=int, default=2000, help='synthetic wikis')
+    parser.add_argument('--repeat', type=int, default=20, help='timed rounds per benchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = run_benchmarks(directory, args.points, args.wikis, args.repeat, args.seed)
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'parameters': {'points': args.points, 'wikis': args.wikis, 'repeat': args.repeat, 'seed': args.seed},
+        'results': results
+    }
+    for name, result in results.items():
+        if 'rows_per_second' in result:
+            print(f'{name:<34} {result["rows_per_second"]:>12.0f} rows/s')
+        else:
+            print(f'{name:<34} median {result["median_ms"]:>9.3f}ms  p95 {result["p95_ms"]:>9.3f}ms')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['parameters'] != report['parameters']:
+            print(f'Note: baseline parameters differ: {baseline["parameters"]}')
+        print()
+        print('\n'.join(compare(results, baseline['results'])))
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
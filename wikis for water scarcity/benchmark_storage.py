@@ -0,0 +1,124 @@
+"""Concurrent read/write benchmark of the SQLite storage profile.
+
+Runs listing reads on several threads while another thread keeps writing,
+first with SQLite defaults (rollback journal, a new connection per checkout)
+and then with database.storage_profile (WAL, pragmas, pooled connections).
+
+    python benchmark_storage.py --seconds 5 --readers 4 --writers 1
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+import argparse
+import os
+import tempfile
+import threading
+import time
+from database import create_tuned_engine
+
+SCHEMA = [
+    'CREATE TABLE wiki (id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL, content TEXT NOT NULL, '
+    'date_posted DATETIME NOT NULL, category VARCHAR(20) NOT NULL)',
+    'CREATE INDEX ix_wiki_date_posted_id ON wiki (date_posted, id)',
+    'CREATE INDEX ix_wiki_category_date_posted_id ON wiki (category, date_posted, id)'
+]
+LISTING = text(
+    'SELECT id, title, date_posted FROM wiki WHERE category = :category '
+    'ORDER BY date_posted DESC, id DESC LIMIT 20'
+)
+CATEGORIES = ('agriculture', 'domestic', 'business')
+
+def seed(engine, rows):
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        for statement in SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(
+            text('INSERT INTO wiki (title, content, date_posted, category) VALUES (:title, :content, :date_posted, :category)'),
+            [{
+                'title': f'Wiki {i}', 'content': 'Rainwater harvesting. ' * 50,
+                'date_posted': start + timedelta(minutes=i), 'category': CATEGORIES[i % 3]
+            } for i in range(rows)]
+        )
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run(engine, seconds, readers, writers):
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {'reads': [], 'writes': [], 'errors': 0}
+
+    def timed(kind, work):
+        began = time.perf_counter()
+        try:
+            work()
+        except OperationalError:
+            with lock:
+                results['errors'] += 1
+            return
+        with lock:
+            results[kind].append(time.perf_counter() - began)
+
+    def reader(number):
+        i = number
+        while not stop.is_set():
+            def work():
+                with engine.connect() as connection:
+                    connection.execute(LISTING, {'category': CATEGORIES[i % 3]}).fetchall()
+            timed('reads', work)
+            i += 1
+
+    def writer(number):
+        i = number
+        while not stop.is_set():
+            def work():
+                with engine.begin() as connection:
+                    connection.execute(
+                        text('INSERT INTO wiki (title, content, date_posted, category) VALUES (:title, :content, :now, :category)'),
+                        {'title': f'New {i}', 'content': 'Edited. ' * 200, 'now': datetime.utcnow(), 'category': CATEGORIES[i % 3]}
+                    )
+                    connection.execute(text('UPDATE wiki SET content = :content WHERE id = :id'), {'content': f'Edit {i}', 'id': i % 1000 + 1})
+            timed('writes', work)
+            i += 1
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=1)
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f'{args.readers} readers, {args.writers} writers, {args.seconds:g}s per profile, {args.rows} rows')
+    print(f'{"profile":<8} {"reads/s":>9} {"read p95":>10} {"writes/s":>9} {"write p95":>10} {"errors":>7}')
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in ('default', 'tuned'):
+            url = f'sqlite:///{os.path.join(directory, profile + ".db")}'
+            engine = create_tuned_engine(url) if profile == 'tuned' else create_engine(url)
+            seed(engine, args.rows)
+            results = run(engine, args.seconds, args.readers, args.writers)
+            engine.dispose()
+            print(
+                f'{profile:<8} {len(results["reads"]) / args.seconds:>9.0f} '
+                f'{percentile(results["reads"], 0.95) * 1000:>8.2f}ms '
+                f'{len(results["writes"]) / args.seconds:>9.0f} '
+                f'{percentile(results["writes"], 0.95) * 1000:>8.2f}ms '
+                f'{results["errors"]:>7}'
+            )
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
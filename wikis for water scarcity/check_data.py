@@ -1,7 +1,8 @@
-from app import app, db
+from app import create_app
 from water_level_data import WaterLevelData
 
 def check_data():
+    app = create_app()
     with app.app_context():
         try:
             count = WaterLevelData.query.count()
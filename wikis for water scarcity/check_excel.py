@@ -1,11 +1,20 @@
-import pandas as pd
+import os
+import sys
+from dotenv import load_dotenv
+from import_excel import detect_file_format, read_frames
+
+load_dotenv()
+
+# Accepts any importer format: Excel, CSV, Parquet or Arrow IPC
+file_path = sys.argv[1] if len(sys.argv) > 1 else os.getenv('EXCEL_FILE_PATH')
 
 try:
-    # Read the Excel file
-    df = pd.read_excel(r'C:\Users\Hp\OneDrive\Desktop\Copy of jan_2023_data_for_website_co_ordinates_1(1).xlsx')
+    # Read only the first chunk of the file
+    df = next(read_frames(file_path, chunk_size=1000))
+    print(f'\nFormat: {detect_file_format(file_path)}')
     
     # Print column names
-    print('\nColumns in Excel file:')
+    print('\nColumns in file:')
     for col in df.columns:
         print(f'- {col}')
     
@@ -14,4 +23,4 @@ try:
     print(df.head(3))
     
 except Exception as e:
-    print(f'Error reading Excel file: {str(e)}')
\ No newline at end of file
+    print(f'Error reading file: {str(e)}')
\ No newline at end of file
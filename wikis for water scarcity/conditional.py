@@ -0,0 +1,50 @@
+from flask import current_app, request, session
+from werkzeug.http import is_resource_modified
+import hashlib
+
+def make_etag(*parts):
+    """Strong ETag value built from everything a response depends on."""
+    return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+def not_modified(etag, last_modified=None):
+    """Return an empty 304 response if the client's copy is still current, else None.
+
+    Call this before querying or rendering anything the validators do not
+    need. ``If-None-Match`` takes precedence over ``If-Modified-Since``.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    # The page must be rendered to show flashed messages, and they would be
+    # consumed by a 304 without the client ever seeing them
+    if '_flashes' in session:
+        return None
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    response = current_app.response_class(status=304)
+    return add_validators(response, etag, last_modified)
+
+def add_validators(response, etag, last_modified=None):
+    """Attach ``ETag``/``Last-Modified`` and ask caches to revalidate before reuse."""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    # Pages differ per logged-in user
+    response.vary.add('Cookie')
+    return response
+
+def public_not_modified(etag, max_age):
+    """``not_modified`` for responses that are the same for every user.
+
+    Leaves the session alone, so the response does not vary by cookie.
+    """
+    if request.method not in ('GET', 'HEAD') or is_resource_modified(request.environ, etag=etag):
+        return None
+    return add_public_validators(current_app.response_class(status=304), etag, max_age)
+
+def add_public_validators(response, etag, max_age):
+    """Attach ``ETag`` and let browsers and shared caches reuse the response for ``max_age`` seconds."""
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
\ No newline at end of file
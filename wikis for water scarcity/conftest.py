@@ -0,0 +1,28 @@
+import pytest
+from app import create_app
+from database import db
+
+@pytest.fixture
+def app_config():
+    """Settings for the ``app`` fixture; a test module overrides this to change them."""
+    return {}
+
+@pytest.fixture
+def app(tmp_path, app_config):
+    """An app on a new SQLite database in ``tmp_path``; its schema is created as it starts.
+
+    A test module adds its own data by overriding ``app`` with a fixture
+    that takes this one.
+    """
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}',
+        'WATER_DATA_DIR': str(tmp_path / 'water_data'),
+        **app_config
+    })
+    yield app
+    with app.app_context():
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
\ No newline at end of file
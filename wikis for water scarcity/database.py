@@ -1,8 +1,81 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+import os
+import sqlite3
 
-db = SQLAlchemy()
+# Applied to every new SQLite connection. WAL lets readers run alongside a
+# writer; NORMAL sync is still crash-safe in WAL mode, only the last commits
+# before a power loss may be lost.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -int(os.getenv('SQLITE_CACHE_SIZE_KB', 64 * 1024)),  # negative means KiB
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'temp_store': 'MEMORY'
+}
+
+def storage_profile(url):
+    """Engine options for a database URL: pooling sized per backend."""
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            return {}  # Flask-SQLAlchemy keeps in-memory databases on one static connection
+        # Flask-SQLAlchemy would otherwise open a new (cold) connection per checkout
+        return {
+            'poolclass': QueuePool,
+            'pool_size': int(os.getenv('SQLITE_POOL_SIZE', 5)),
+            'max_overflow': int(os.getenv('SQLITE_MAX_OVERFLOW', 10)),
+            'connect_args': {
+                'check_same_thread': False,  # Pooled connections move between threads
+                'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000
+            }
+        }
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_pre_ping': True,  # Drop connections the server closed while idle
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800))
+    }
+
+def configure_engine(engine):
+    """Apply ``SQLITE_PRAGMAS`` to each connection ``engine`` opens."""
+    if engine.dialect.name != 'sqlite':
+        return engine
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    return engine
+
+def create_tuned_engine(url, **options):
+    """A standalone engine with the same storage profile as the app's."""
+    return configure_engine(create_engine(url, **{**storage_profile(url), **options}))
+
+class ProfiledSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with ``storage_profile`` pooling and SQLite pragmas.
+
+    Explicit ``SQLALCHEMY_ENGINE_OPTIONS`` still take precedence.
+    """
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        for key, value in storage_profile(sa_url).items():
+            options.setdefault(key, value)
+        return super().apply_driver_hacks(app, sa_url, options)
+
+    def create_engine(self, sa_url, engine_opts):
+        return configure_engine(super().create_engine(sa_url, engine_opts))
+
+db = ProfiledSQLAlchemy()
 
 def init_db(app):
-    db.init_app(app)
-    with app.app_context():
-        db.create_all()
\ No newline at end of file
+    # Tables are created by init_schema, which create_app runs only when migrations are pending
+    db.init_app(app)
\ No newline at end of file
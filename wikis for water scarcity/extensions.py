@@ -0,0 +1,13 @@
+from flask_login import LoginManager
+from flask_wtf.csrf import CSRFProtect
+from fragment_cache import FragmentCache
+from media_store import MediaStore
+from request_metrics import RequestMetrics
+
+# Created unbound and attached to each app by create_app
+csrf = CSRFProtect()
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+fragment_cache = FragmentCache()
+media_store = MediaStore()
+request_metrics = RequestMetrics()
\ No newline at end of file
@@ -0,0 +1,220 @@
+from collections import OrderedDict
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+# A hit refreshes an entry's LRU time only when it is older than this, so
+# most reads of the shared cache do not take its write lock
+LRU_REFRESH_SECONDS = 60
+
+class MemoryCacheBackend:
+    """Per-process LRU cache capped by the total UTF-8 size of its values."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        size = len(value.encode())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry[1]
+
+class SqliteCacheBackend:
+    """LRU cache in a local SQLite file, shared by every worker process on the host.
+
+    Stands in for a shared cache such as memcached or Redis: a fragment
+    rendered by one worker is served by all of them. The total size is kept
+    in ``fragments_size`` by every write, so storing never sums the table.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        connection = self._connect()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS fragments '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_fragments_used ON fragments (used)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS fragments_size (id INTEGER PRIMARY KEY CHECK (id = 1), total INTEGER NOT NULL)'
+            )
+            connection.execute('INSERT OR IGNORE INTO fragments_size (id, total) SELECT 1, COALESCE(SUM(size), 0) FROM fragments')
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        connection = self._connect()
+        row = connection.execute('SELECT value, used FROM fragments WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > LRU_REFRESH_SECONDS:
+            connection.execute('UPDATE fragments SET used = ? WHERE key = ?', (now, key))
+        return row[0]
+
+    @property
+    def size(self):
+        return self._connect().execute('SELECT total FROM fragments_size').fetchone()[0]
+
+    def set(self, key, value):
+        size = len(value.encode())
+        if size > self.max_bytes:
+            return
+        connection = self._connect()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            previous = connection.execute('SELECT size FROM fragments WHERE key = ?', (key,)).fetchone()
+            connection.execute(
+                'INSERT OR REPLACE INTO fragments (key, value, size, used) VALUES (?, ?, ?, ?)',
+                (key, value, size, time.time())
+            )
+            connection.execute('UPDATE fragments_size SET total = total + ?', (size - (previous[0] if previous else 0),))
+            total = connection.execute('SELECT total FROM fragments_size').fetchone()[0]
+            if total > self.max_bytes:
+                # Drop least recently used entries until back under the cap
+                excess = total - self.max_bytes
+                evict = []
+                for evict_key, evict_size in connection.execute('SELECT key, size FROM fragments ORDER BY used'):
+                    if excess <= 0:
+                        break
+                    evict.append((evict_key,))
+                    excess -= evict_size
+                connection.executemany('DELETE FROM fragments WHERE key = ?', evict)
+                connection.execute('UPDATE fragments_size SET total = ?', (self.max_bytes + excess,))
+
+    def delete(self, key):
+        connection = self._connect()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute('SELECT size FROM fragments WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                connection.execute('DELETE FROM fragments WHERE key = ?', (key,))
+                connection.execute('UPDATE fragments_size SET total = total - ?', (row[0],))
+
+class NullCacheBackend:
+    """Caches nothing; every lookup renders."""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+class FragmentCache:
+    """Rendered template fragments keyed by what they depend on.
+
+    Keys hold the validators of the data a fragment was rendered from: the
+    wiki version, the newest change and row count of the wikis for listings,
+    and the water level data generation for map tiles. A change makes new
+    keys rather than deleting entries, so workers with their own memory
+    cache never serve a stale fragment; replaced entries age out of the LRU.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryCacheBackend()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Use the backend configured by ``FRAGMENT_CACHE_*`` in ``app``."""
+        self.backend = create_backend(
+            app.config['FRAGMENT_CACHE_BACKEND'],
+            max_bytes=app.config['FRAGMENT_CACHE_MAX_BYTES'],
+            path=app.config['FRAGMENT_CACHE_PATH']
+        )
+        app.extensions['fragment_cache'] = self
+
+    def get_or_render(self, key, render):
+        """Return the cached value for ``key``, calling ``render`` to fill it on a miss.
+
+        ``render`` must return a JSON-serializable value.
+        """
+        cached = self.backend.get(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return json.loads(cached)
+        with self._lock:
+            self.misses += 1
+        value = render()
+        self.backend.set(key, json.dumps(value))
+        return value
+
+    def put(self, key, value):
+        """Store a JSON-serializable value ahead of its first use."""
+        self.backend.set(key, json.dumps(value))
+
+    def wiki_key(self, wiki_id, version, variant):
+        return f'wiki:{wiki_id}:{version}:{variant}'
+
+    def listing_key(self, endpoint, variant, params, last_modified, count):
+        """Key of a listing page; ``last_modified`` and ``count`` describe the wikis it lists from."""
+        filters = '&'.join(f'{name}={value}' for name, value in sorted(params.items()))
+        return f'listing:{last_modified}:{count}:{endpoint}:{variant}:{filters}'
+
+    def tile_key(self, data_generation, z, x, y):
+        # Keyed by the water level data generation; tiles of replaced data age out
+        return f'tile:{data_generation}:{z}/{x}/{y}'
+
+    def stats(self):
+        with self._lock:
+            stats = {'hits': self.hits, 'misses': self.misses}
+        total = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / total, 3) if total else None
+        stats['backend'] = type(self.backend).__name__
+        if isinstance(self.backend, (MemoryCacheBackend, SqliteCacheBackend)):
+            stats['size_bytes'] = self.backend.size
+            stats['max_bytes'] = self.backend.max_bytes
+        return stats
+
+def create_backend(name, max_bytes=DEFAULT_MAX_BYTES, path=None):
+    """Build a cache backend from configuration: ``memory``, ``sqlite`` or ``none``."""
+    if name == 'memory':
+        return MemoryCacheBackend(max_bytes)
+    if name == 'sqlite':
+        return SqliteCacheBackend(path, max_bytes)
+    if name == 'none':
+        return NullCacheBackend()
+    raise ValueError(f'Unknown fragment cache backend: {name}')
\ No newline at end of file
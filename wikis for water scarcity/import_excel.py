@@ -1,84 +1,490 @@
 import pandas as pd
+import numpy as np
+import hashlib
+import time
+import uuid
+from contextlib import contextmanager
 from database import db
+from sqlalchemy.exc import IntegrityError
 from flask import current_app as app
-from water_level_data import WaterLevelData
+from water_level_data import WaterLevelData, WaterLevelMeta, bump_data_generation, get_meta_value, set_meta_value
+from scarcity_raster import build_scarcity_raster
+from water_level_index import build_tile_cache, build_water_level_snapshot
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
-def validate_data(row):
-    """Validate a single row of data from Excel."""
+REQUIRED_COLUMNS = ['latitude', 'longitude', 'water_level']
+INSERT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 5000))
+READ_CHUNK_SIZE = int(os.getenv('IMPORT_READ_CHUNK_SIZE', 200000))
+
+# Leading bytes identifying each supported input format
+FILE_SIGNATURES = [
+    (b'PK\x03\x04', 'excel'),                          # .xlsx (zip container)
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'excel'),  # legacy .xls
+    (b'PAR1', 'parquet'),
+    (b'ARROW1', 'arrow'),                              # Arrow IPC file / Feather v2
+    (b'\xff\xff\xff\xff', 'arrow_stream'),           # Arrow IPC stream
+]
+FILE_EXTENSIONS = {
+    '.xlsx': 'excel', '.xls': 'excel', '.csv': 'csv', '.txt': 'csv',
+    '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.arrows': 'arrow_stream'
+}
+
+LIVE_TABLE = WaterLevelData.__tablename__
+# Each import loads into its own staging table, named with this prefix
+STAGING_PREFIX = f'{LIVE_TABLE}_staging_'
+PREVIOUS_TABLE = f'{LIVE_TABLE}_previous'
+
+# Decimal places kept when hashing rows, so float noise does not count as a change
+HASH_PRECISION = 6
+DELETE_CHUNK_SIZE = 500
+
+# Imports and rollbacks swap the live table, so only one may run at a time
+# across all workers; the lock is a row in water_level_meta. A lock older
+# than IMPORT_LOCK_TIMEOUT seconds is taken to be left by a crashed worker.
+IMPORT_LOCK_KEY = 'import_lock'
+IMPORT_LOCK_TIMEOUT = int(os.getenv('IMPORT_LOCK_TIMEOUT', 3600))
+IMPORT_LOCK_POLL_SECONDS = 0.5
+
+class ImportLocked(Exception):
+    """Another import or rollback holds the import lock."""
+
+def _try_lock(token):
+    expires_at = time.time() + IMPORT_LOCK_TIMEOUT
+    value = f'{expires_at:.0f} {token}'
     try:
-        # Clean and convert values, handling potential NaN or empty cells
-        lat = pd.to_numeric(row['latitude'], errors='coerce')
-        lon = pd.to_numeric(row['longitude'], errors='coerce')
-        water_level = pd.to_numeric(str(row['water_level']).strip(), errors='coerce')
-        
-        # Check for NaN values after conversion
-        if pd.isna(lat) or pd.isna(lon) or pd.isna(water_level):
-            return False, "Missing or invalid data in row"
-        
-        if not (-90 <= lat <= 90):
-            return False, f"Invalid latitude value: {lat}"
-        if not (-180 <= lon <= 180):
-            return False, f"Invalid longitude value: {lon}"
-        if water_level < 0:
-            return False, f"Invalid water level value: {water_level}"
-            
-        return True, None
-    except Exception as e:
-        return False, str(e)
+        db.session.add(WaterLevelMeta(key=IMPORT_LOCK_KEY, value=value))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
 
-def import_excel_data(file_path):
-    """Import water level data from Excel file."""
+    held = get_meta_value(IMPORT_LOCK_KEY)
+    if held is None or float(held.split()[0]) > time.time():
+        db.session.rollback()
+        return False
+    # Take over an abandoned lock only if nobody else has meanwhile
+    taken = WaterLevelMeta.query.filter_by(key=IMPORT_LOCK_KEY, value=held).update({'value': value})
+    db.session.commit()
+    return taken == 1
+
+@contextmanager
+def import_lock(wait=None):
+    """Hold the import lock shared by every worker using this database.
+
+    Waits up to ``wait`` seconds (forever if None) for a running import to
+    finish, then raises ``ImportLocked``.
+    """
+    token = uuid.uuid4().hex
+    deadline = None if wait is None else time.monotonic() + wait
+    while not _try_lock(token):
+        if deadline is not None and time.monotonic() >= deadline:
+            raise ImportLocked('Another water level import is in progress')
+        time.sleep(IMPORT_LOCK_POLL_SECONDS)
     try:
-        # Read Excel file
-        df = pd.read_excel(file_path)
-        
+        yield
+    finally:
+        db.session.rollback()
+        WaterLevelMeta.query.filter(
+            WaterLevelMeta.key == IMPORT_LOCK_KEY, WaterLevelMeta.value.endswith(f' {token}')
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+def detect_file_format(file_path):
+    """Identify the input format from the file's leading bytes, falling back to its extension."""
+    with open(file_path, 'rb') as f:
+        header = f.read(8)
+    for signature, file_format in FILE_SIGNATURES:
+        if header.startswith(signature):
+            return file_format
+    return FILE_EXTENSIONS.get(os.path.splitext(file_path)[1].lower(), 'csv')
+
+def _arrow_batches(file_path, file_format, chunk_size):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError(f'Reading {file_format} files requires the pyarrow package')
+
+    if file_format == 'parquet':
+        yield from pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size)
+        return
+
+    # Memory-map Arrow IPC files so record batches are read without copying
+    with pa.memory_map(file_path) as source:
+        if file_format == 'arrow':
+            reader = pa.ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        else:
+            batches = pa.ipc.open_stream(source)
+        for batch in batches:
+            for start in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(start, chunk_size)
+
+def read_frames(file_path, chunk_size=READ_CHUNK_SIZE):
+    """Yield the raw rows of an Excel, CSV, Parquet or Arrow IPC file as DataFrames.
+
+    CSV and columnar formats are streamed in chunks of about ``chunk_size``
+    rows; Excel sheets are read whole.
+    """
+    file_format = detect_file_format(file_path)
+    if file_format == 'excel':
+        yield pd.read_excel(file_path)
+    elif file_format == 'csv':
+        yield from pd.read_csv(file_path, chunksize=chunk_size)
+    else:
+        for batch in _arrow_batches(file_path, file_format, chunk_size):
+            yield batch.to_pandas()
+
+def read_water_level_data(file_path, chunk_size=READ_CHUNK_SIZE):
+    """Yield water level rows as DataFrames with cleaned, checked column names.
+
+    Each frame is indexed by its position in the file so error rows keep
+    their row numbers across chunks.
+    """
+    offset = 0
+    for df in read_frames(file_path, chunk_size):
         # Clean column names by removing extra whitespace and newlines
-        df.columns = df.columns.str.strip().str.replace('\n', '')
-        
+        df.columns = df.columns.astype(str).str.strip().str.replace('\n', '')
+
         # Check required columns
-        required_columns = ['latitude', 'longitude', 'water_level']
-        if not all(col in df.columns for col in required_columns):
-            missing = [col for col in required_columns if col not in df.columns]
+        if not all(col in df.columns for col in REQUIRED_COLUMNS):
+            missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
             raise ValueError(f"Missing required columns: {', '.join(missing)}")
-        
-        # Process each row
-        success_count = 0
-        error_rows = []
-        
-        for index, row in df.iterrows():
-            is_valid, error_msg = validate_data(row)
-            
-            if is_valid:
-                # Create new water level data entry
-                water_data = WaterLevelData(
-                    latitude=float(row['latitude']),
-                    longitude=float(row['longitude']),
-                    water_level=float(row['water_level'])
-                )
-                db.session.add(water_data)
-                success_count += 1
-            else:
-                error_rows.append({
-                    'row': index + 2,  # Excel row number (1-based + header)
-                    'error': error_msg
-                })
-        
-        # Commit changes if there were any successful imports
-        if success_count > 0:
+
+        df.index = pd.RangeIndex(offset, offset + len(df))
+        offset += len(df)
+        yield df
+
+def drop_staging_table(name):
+    db.session.rollback()
+    db.session.execute(db.text(f'DROP TABLE IF EXISTS {name}'))
+    db.session.commit()
+
+def drop_abandoned_staging_tables():
+    """Drop staging tables left by imports that died; call only while holding the import lock."""
+    for name in db.inspect(db.session.connection()).get_table_names():
+        if name.startswith(STAGING_PREFIX):
+            drop_staging_table(name)
+
+def validate_frame(df):
+    """Validate every row of a sheet at once.
+
+    Returns the cleaned valid rows as a float DataFrame and a list of
+    ``{'row', 'error'}`` dicts for the rejected ones, using spreadsheet row
+    numbers (header on row 1).
+    """
+    lat = pd.to_numeric(df['latitude'], errors='coerce')
+    lon = pd.to_numeric(df['longitude'], errors='coerce')
+    water_level = df['water_level']
+    if water_level.dtype == object:
+        water_level = water_level.astype(str).str.strip()
+    water_level = pd.to_numeric(water_level, errors='coerce')
+
+    # Checks are ordered by priority; a row reports only the first it fails
+    missing = (lat.isna() | lon.isna() | water_level.isna()).to_numpy()
+    bad_lat = ~missing & ~lat.between(-90, 90).to_numpy()
+    bad_lon = ~missing & ~bad_lat & ~lon.between(-180, 180).to_numpy()
+    # inf parses as a number but has no JSON form, so the API could not return it
+    bad_level = ~missing & ~bad_lat & ~bad_lon & ((water_level < 0) | ~np.isfinite(water_level)).to_numpy()
+    valid = ~(missing | bad_lat | bad_lon | bad_level)
+
+    error_rows = []
+    checks = [
+        (missing, None, "Missing or invalid data in row"),
+        (bad_lat, lat, "Invalid latitude value: {}"),
+        (bad_lon, lon, "Invalid longitude value: {}"),
+        (bad_level, water_level, "Invalid water level value: {}"),
+    ]
+    for mask, values, message in checks:
+        if not mask.any():
+            continue
+        positions = np.flatnonzero(mask)
+        if values is None:
+            errors = [message] * len(positions)
+        else:
+            errors = [message.format(float(value)) for value in values.to_numpy()[positions]]
+        error_rows.extend(
+            {'row': int(index) + 2, 'error': error}  # Excel row number (1-based + header)
+            for index, error in zip(df.index[positions], errors)
+        )
+    error_rows.sort(key=lambda error: error['row'])
+
+    valid_rows = pd.DataFrame({
+        'latitude': lat[valid].astype(float),
+        'longitude': lon[valid].astype(float),
+        'water_level': water_level[valid].astype(float)
+    })
+    return valid_rows, error_rows
+
+def insert_rows(valid_rows, table=None, chunk_size=INSERT_CHUNK_SIZE, progress=None):
+    """Bulk insert validated rows with executemany, ``chunk_size`` rows at a time.
+
+    ``progress`` is called with the running ``rows_inserted`` after each chunk.
+    """
+    table = table if table is not None else WaterLevelData.__table__
+    statement = table.insert()
+    inserted = 0
+    for start in range(0, len(valid_rows), chunk_size):
+        chunk = valid_rows.iloc[start:start + chunk_size]
+        db.session.execute(statement, chunk.to_dict('records'))
+        inserted += len(chunk)
+        if progress:
+            progress(rows_inserted=inserted)
+    return inserted
+
+def create_staging_table():
+    """Create an empty staging table shaped like ``water_level_data``, named for this import."""
+    connection = db.session.connection()
+    staging = db.Table(f'{STAGING_PREFIX}{uuid.uuid4().hex[:12]}', db.MetaData(), *[
+        db.Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+        for column in WaterLevelData.__table__.columns
+    ])
+    staging.create(bind=connection)
+    return staging
+
+def index_staging_table(staging):
+    """Build secondary indexes on the staging table before it goes live.
+
+    Index names stay attached to the table through renames, so each
+    generation gets unique ones.
+    """
+    suffix = uuid.uuid4().hex[:8]
+    db.Index(f'ix_{LIVE_TABLE}_coords_{suffix}', staging.c.latitude, staging.c.longitude) \
+        .create(bind=db.session.connection())
+
+def _has_table(name):
+    return db.inspect(db.session.connection()).has_table(name)
+
+def swap_in_staging_table(staging, source_hash=None):
+    """Atomically make ``staging`` live and keep the replaced data as the previous generation."""
+    # Bumping the generation first opens the transaction, so the DDL below
+    # is part of it even on drivers that autocommit bare DDL statements.
+    bump_data_generation(commit=False)
+    set_meta_value('source_hash', source_hash or '')
+    db.session.execute(db.text(f'DROP TABLE IF EXISTS {PREVIOUS_TABLE}'))
+    db.session.execute(db.text(f'ALTER TABLE {LIVE_TABLE} RENAME TO {PREVIOUS_TABLE}'))
+    db.session.execute(db.text(f'ALTER TABLE {staging.name} RENAME TO {LIVE_TABLE}'))
+    db.session.commit()
+
+def rebuild_derived_data():
+    """Rebuild the files derived from the live water level data after it changed.
+
+    The snapshot that workers map their spatial index from is written first,
+    then the scarcity raster and the low-zoom map tiles. Failures are logged
+    rather than raised: the data is already committed and workers fall back
+    to loading it from the database, to nearest-well lookups and to
+    computing tiles on demand.
+    """
+    for name, build in (
+        ('water level snapshot', build_water_level_snapshot),
+        ('scarcity raster', build_scarcity_raster),
+        ('map tile cache', build_tile_cache)
+    ):
+        try:
+            started = time.perf_counter()
+            build()
+            app.logger.info(f'Built the {name} in {time.perf_counter() - started:.2f}s')
+        except Exception as e:
+            app.logger.error(f'Building the {name} failed: {str(e)}')
+
+def rollback_water_level_data(wait=60):
+    """Swap the previous generation back in; the replaced data becomes the previous one.
+
+    Gives up after waiting ``wait`` seconds for a running import.
+    """
+    try:
+        with import_lock(wait):
+            if not _has_table(PREVIOUS_TABLE):
+                return False
+            swap = f'{STAGING_PREFIX}{uuid.uuid4().hex[:12]}'
+            bump_data_generation(commit=False)
+            set_meta_value('source_hash', '')
+            db.session.execute(db.text(f'ALTER TABLE {LIVE_TABLE} RENAME TO {swap}'))
+            db.session.execute(db.text(f'ALTER TABLE {PREVIOUS_TABLE} RENAME TO {LIVE_TABLE}'))
+            db.session.execute(db.text(f'ALTER TABLE {swap} RENAME TO {PREVIOUS_TABLE}'))
             db.session.commit()
-        
-        return {
-            'success': True,
-            'imported_count': success_count,
-            'error_rows': error_rows
-        }
-        
+            rebuild_derived_data()
+            return True
     except Exception as e:
         db.session.rollback()
+        app.logger.error(f'Water level data rollback failed: {str(e)}')
+        return False
+
+def file_content_hash(file_path, chunk_size=1024 * 1024):
+    """SHA-256 of the file contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def row_hashes(rows):
+    """Hash normalized rows, returning ``(key_hashes, row_hashes)`` arrays.
+
+    The key identifies a well by its rounded coordinates (plus its occurrence
+    number when several rows share a location); the row hash also covers the
+    water level, so a differing row hash under the same key is a change.
+    """
+    normalized = rows[REQUIRED_COLUMNS].round(HASH_PRECISION).reset_index(drop=True)
+    location = normalized[['latitude', 'longitude']]
+    occurrence = location.groupby(['latitude', 'longitude']).cumcount()
+    keys = pd.util.hash_pandas_object(location.assign(occurrence=occurrence), index=False)
+    hashes = pd.util.hash_pandas_object(normalized, index=False)
+    return keys.to_numpy(), hashes.to_numpy()
+
+def apply_delta(valid_rows, progress=None):
+    """Insert, update and delete only the live rows that differ from ``valid_rows``.
+
+    Changes are staged in the current transaction; returns the row counts.
+    """
+    table = WaterLevelData.__table__
+    current = pd.DataFrame(
+        db.session.execute(
+            db.select([table.c.id, table.c.latitude, table.c.longitude, table.c.water_level]).order_by(table.c.id)
+        ).fetchall(),
+        columns=['id'] + REQUIRED_COLUMNS
+    )
+    new_keys, new_hashes = row_hashes(valid_rows)
+    old_keys, old_hashes = row_hashes(current)
+
+    incoming = valid_rows[REQUIRED_COLUMNS].reset_index(drop=True).assign(key=new_keys, new_hash=new_hashes)
+    existing = pd.DataFrame({'key': old_keys, 'old_hash': old_hashes, 'id': current['id'].to_numpy()})
+    # Keep file order for new rows so duplicate locations keep their occurrence numbers
+    added = incoming[~np.isin(new_keys, old_keys)]
+    removed = existing[~np.isin(old_keys, new_keys)]
+    both = incoming.merge(existing, on='key', how='inner')
+    changed = both[both['new_hash'] != both['old_hash']]
+
+    removed_ids = removed['id'].astype(int).tolist()
+    for start in range(0, len(removed_ids), DELETE_CHUNK_SIZE):
+        db.session.execute(table.delete().where(table.c.id.in_(removed_ids[start:start + DELETE_CHUNK_SIZE])))
+
+    if len(changed):
+        statement = table.update().where(table.c.id == db.bindparam('row_id')).values(
+            latitude=db.bindparam('latitude'),
+            longitude=db.bindparam('longitude'),
+            water_level=db.bindparam('water_level')
+        )
+        updates = changed[REQUIRED_COLUMNS].assign(row_id=changed['id'].astype(int))
+        db.session.execute(statement, updates.to_dict('records'))
+
+    insert_rows(added[REQUIRED_COLUMNS], table, progress=progress)
+
+    return {
+        'added': len(added),
+        'changed': len(changed),
+        'removed': len(removed),
+        'unchanged': len(both) - len(changed)
+    }
+
+def import_excel_data(file_path, progress=None, incremental=False):
+    """Import water level data from an Excel, CSV, Parquet or Arrow file, replacing the current data.
+
+    Rows are loaded, validated and indexed in a staging table that is swapped
+    with the live table in a single transaction, so readers never see a
+    partial import and a failed import leaves the current data untouched.
+    ``progress``, if given, is called with keyword counts (``rows_parsed``,
+    ``rows_validated``, ``rows_inserted``, ``errors``) as the import advances.
+
+    With ``incremental=True`` the file is skipped when its content hash matches
+    the last import, and otherwise only rows that were added, changed or
+    removed are written to the live table. The previous generation kept for
+    rollback is the data replaced by the last full import.
+    """
+    progress = progress or (lambda **counts: None)
+    staging = None
+    try:
+        with import_lock():
+            drop_abandoned_staging_tables()
+            started = time.perf_counter()
+            source_hash = file_content_hash(file_path)
+            if incremental and source_hash == get_meta_value('source_hash'):
+                unchanged = WaterLevelData.query.count()
+                return {
+                    'success': True,
+                    'skipped': True,
+                    'imported_count': 0,
+                    'error_rows': [],
+                    'added': 0,
+                    'changed': 0,
+                    'removed': 0,
+                    'unchanged': unchanged
+                }
+
+            rows_parsed = 0
+            valid_count = 0
+            success_count = 0
+            error_rows = []
+            valid_chunks = []
+            if not incremental:
+                staging = create_staging_table()
+
+            for df in read_water_level_data(file_path):
+                rows_parsed += len(df)
+                progress(rows_parsed=rows_parsed)
+
+                valid_rows, chunk_errors = validate_frame(df)
+                valid_count += len(valid_rows)
+                error_rows.extend(chunk_errors)
+                progress(rows_validated=valid_count, errors=len(error_rows))
+
+                if incremental:
+                    valid_chunks.append(valid_rows)
+                else:
+                    inserted = success_count
+                    success_count += insert_rows(
+                        valid_rows, staging,
+                        progress=lambda rows_inserted: progress(rows_inserted=inserted + rows_inserted)
+                    )
+
+            if valid_count == 0:
+                if staging is not None:
+                    drop_staging_table(staging.name)
+                    staging = None
+                return {
+                    'success': False,
+                    'error': 'No valid rows found; existing data was kept',
+                    'imported_count': 0,
+                    'error_rows': error_rows
+                }
+
+            if incremental:
+                counts = apply_delta(pd.concat(valid_chunks), progress=progress)
+                changed = counts['added'] or counts['changed'] or counts['removed']
+                if changed:
+                    bump_data_generation(commit=False)
+                set_meta_value('source_hash', source_hash)
+                db.session.commit()
+                success_count = counts['added'] + counts['changed']
+            else:
+                index_staging_table(staging)
+                db.session.commit()
+                swap_in_staging_table(staging, source_hash)
+                staging = None
+                counts = {}
+                changed = True
+
+            elapsed = time.perf_counter() - started
+            if changed:
+                rebuild_derived_data()
+            return {
+                'success': True,
+                'imported_count': success_count,
+                'error_rows': error_rows,
+                'elapsed_seconds': round(elapsed, 3),
+                'rows_per_second': round(rows_parsed / elapsed, 1) if elapsed > 0 else None,
+                **counts
+            }
+
+    except Exception as e:
+        if staging is not None:
+            try:
+                drop_staging_table(staging.name)
+            except Exception:
+                db.session.rollback()
         return {
             'success': False,
             'error': str(e),
@@ -89,9 +495,13 @@ def import_excel_data(file_path):
 def clear_water_level_data():
     """Clear all existing water level data."""
     try:
-        WaterLevelData.query.delete()
-        db.session.commit()
-        return True
+        with import_lock(wait=60):
+            WaterLevelData.query.delete()
+            set_meta_value('source_hash', '')
+            db.session.commit()
+            bump_data_generation()
+            rebuild_derived_data()
+            return True
     except Exception:
         db.session.rollback()
         return False
\ No newline at end of file
@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from database import db
+import json
+import threading
+import uuid
+import os
+
+class ImportJob(db.Model):
+    """State of one background water level import.
+
+    Jobs are rows so any worker can answer a status poll, whichever one runs
+    the import.
+    """
+    __tablename__ = 'import_job'
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    file_path = db.Column(db.String(500), nullable=False)
+    incremental = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.String(10), nullable=False, default='queued')  # 'queued', 'running', 'succeeded', 'failed'
+    progress = db.Column(db.Text)  # JSON counts
+    result = db.Column(db.Text)  # JSON result of import_excel_data
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def done(self):
+        return self.status in ('succeeded', 'failed')
+
+    def to_dict(self, progress=None):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'file': os.path.basename(self.file_path),
+            'mode': 'incremental' if self.incremental else 'full',
+            'progress': progress or json.loads(self.progress or '{}'),
+            'result': json.loads(self.result) if self.result else None,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class ImportJobRunner:
+    """Runs imports on a local thread pool and records them as ``ImportJob`` rows.
+
+    Counts change with every chunk while the import holds its write
+    transaction, so they are kept in memory by the worker running the job
+    and saved to its row when the job's status changes.
+    """
+
+    def __init__(self, max_workers=1, max_jobs=100):
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='import')
+        self._progress = {}
+        self._lock = threading.Lock()
+
+    def submit(self, app, file_path, incremental=False):
+        """Record an import of ``file_path`` and queue it to run inside ``app``'s context.
+
+        Call inside an app context; returns the new job.
+        """
+        job = ImportJob(file_path=file_path, incremental=incremental, status='queued',
+                        progress=json.dumps({'rows_parsed': 0, 'rows_validated': 0, 'rows_inserted': 0, 'errors': 0}))
+        db.session.add(job)
+        # Keep only the most recent finished jobs
+        stale = ImportJob.query.filter(ImportJob.finished_at.isnot(None)) \
+            .order_by(ImportJob.created_at.desc()).offset(self.max_jobs).all()
+        for old in stale:
+            db.session.delete(old)
+        db.session.commit()
+        self._executor.submit(self._run, app, job.id)
+        return job
+
+    def status(self, job_id):
+        """The job as a dict, with live counts when this worker runs it; None if unknown."""
+        job = ImportJob.query.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            progress = dict(self._progress[job_id]) if job_id in self._progress else None
+        return job.to_dict(progress)
+
+    def _update(self, job_id, counts):
+        with self._lock:
+            self._progress[job_id].update(counts)
+
+    def _run(self, app, job_id):
+        # Imported here so pandas loads with the first import, not with the app
+        from import_excel import import_excel_data
+
+        with app.app_context():
+            job = ImportJob.query.get(job_id)
+            with self._lock:
+                self._progress[job_id] = json.loads(job.progress or '{}')
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+            file_path, incremental = job.file_path, job.incremental
+            try:
+                result = import_excel_data(
+                    file_path, progress=lambda **counts: self._update(job_id, counts), incremental=incremental
+                )
+            except Exception as e:
+                db.session.rollback()
+                result = {'success': False, 'error': str(e), 'imported_count': 0, 'error_rows': []}
+
+            if result['success']:
+                app.logger.info(f'Import job {job_id} imported {result["imported_count"]} records')
+            else:
+                app.logger.error(f'Import job {job_id} failed: {result["error"]}')
+            with self._lock:
+                progress = self._progress.pop(job_id)
+            job = ImportJob.query.get(job_id)
+            job.progress = json.dumps(progress)
+            job.result = json.dumps(result)
+            job.finished_at = datetime.utcnow()
+            job.status = 'succeeded' if result['success'] else 'failed'
+            db.session.commit()
+
+import_jobs = ImportJobRunner(max_workers=int(os.getenv('IMPORT_WORKERS', 1)))
\ No newline at end of file
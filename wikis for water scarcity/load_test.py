@@ -0,0 +1,360 @@
+"""Concurrent load test of the running app with per-endpoint latency percentiles.
+
+Seeds a temp database, serves it from a separate process and replays a
+weighted traffic mix from many concurrent clients:
+
+    python load_test.py run --clients 32 --seconds 30 --output before.json
+    python load_test.py run --mix browse=60,view=30,location=10 --output after.json
+    python load_test.py compare before.json after.json
+
+``--url`` targets an already running server instead; its users must accept
+``--username``/``--password`` for the create and import traffic.
+"""
+from http.client import HTTPConnection, HTTPSConnection
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit, urlencode
+from datetime import datetime
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+
+DEFAULT_MIX = 'browse=40,view=30,search=12,location=12,create=5,import=1'
+CSRF_TOKEN = re.compile(r'name="csrf_token" value="([^"]+)"')
+SEARCH_WORDS = ('rain', 'groundwater', 'drip irrigation', 'tank', 'monsoon')
+CATEGORIES = ('agriculture', 'domestic', 'business')
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def tiny_png(rng):
+    """A valid 1x1 PNG of a random colour, so uploads are not all deduplicated."""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    pixel = b'\x00' + bytes(rng.randrange(256) for _ in range(3))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(pixel)) + chunk(b'IEND', b''))
+
+def multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode() + data + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+class Client:
+    """One simulated user: a keep-alive connection and a cookie jar."""
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        self.connection_class = HTTPSConnection if url.scheme == 'https' else HTTPConnection
+        self.netloc = url.netloc
+        self.cookies = {}
+        self.connection = None
+        self.logged_in = False
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        for attempt in (1, 2):
+            if self.connection is None:
+                self.connection = self.connection_class(self.netloc, timeout=60)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                break
+            except (ConnectionError, OSError):
+                # The server closed an idle keep-alive connection
+                self.connection.close()
+                self.connection = None
+                if attempt == 2:
+                    raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        if response.status == 302 and '/login' in (response.headers.get('Location') or ''):
+            return 401, data  # login_required turned the request away
+        return response.status, data
+
+    def csrf_token(self, path):
+        status, data = self.request('GET', path)
+        match = CSRF_TOKEN.search(data.decode('utf-8', 'replace'))
+        return match.group(1) if match else ''
+
+    def login(self, username, password):
+        token = self.csrf_token('/login')
+        status, _ = self.request(
+            'POST', '/login', urlencode({'csrf_token': token, 'username': username, 'password': password}),
+            {'Content-Type': 'application/x-www-form-urlencoded'}
+        )
+        self.logged_in = status == 302
+        return self.logged_in
+
+def random_coordinates(rng):
+    return rng.uniform(8.0, 35.0), rng.uniform(68.0, 97.0)
+
+# Each action returns (endpoint label, status); only the final request is timed
+def browse(client, rng, context):
+    path = '/' if rng.random() < 0.8 else '/?per_page=50'
+    return 'home', client.request('GET', path)[0]
+
+def view(client, rng, context):
+    return 'view_wiki', client.request('GET', f'/wiki/{rng.randint(1, context["wikis"])}')[0]
+
+def search(client, rng, context):
+    args = {'query': rng.choice(SEARCH_WORDS)}
+    if rng.random() < 0.5:
+        args['category'] = rng.choice(CATEGORIES)
+    return 'search', client.request('GET', '/search?' + urlencode(args))[0]
+
+def location(client, rng, context):
+    lat, lon = random_coordinates(rng)
+    args = {'use_location': 'true', 'latitude': f'{lat:.5f}', 'longitude': f'{lon:.5f}'}
+    return 'search_location', client.request('GET', '/search?' + urlencode(args))[0]
+
+def create(client, rng, context):
+    token = client.csrf_token('/create_wiki')
+    body, content_type = multipart({
+        'csrf_token': token,
+        'title': f'Load test {uuid.uuid4().hex[:8]}',
+        'content': '<p>' + ' '.join(rng.choice(SEARCH_WORDS) for _ in range(200)) + '</p>',
+        'water_scarcity_level': rng.choice(('low', 'moderate', 'high')),
+        'category': rng.choice(CATEGORIES)
+    }, {'media': ('photo.png', tiny_png(rng), 'image/png')})
+    return 'create_wiki', client.request('POST', '/create_wiki', body, {'Content-Type': content_type})[0]
+
+def start_import(client, rng, context):
+    # Any page with a form carries a token valid for the session
+    token = client.csrf_token('/create_wiki')
+    return 'import_data', client.request(
+        'POST', '/import-data', urlencode({'csrf_token': token}), {'Content-Type': 'application/x-www-form-urlencoded'}
+    )[0]
+
+ACTIONS = {'browse': browse, 'view': view, 'search': search, 'location': location, 'create': create, 'import': start_import}
+AUTHENTICATED = {'create', 'import'}
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in ACTIONS:
+            raise argparse.ArgumentTypeError(f'Unknown traffic kind {name!r}; choose from {", ".join(ACTIONS)}')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def run_load(base_url, mix, clients, seconds, context, seed=0):
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    samples = []  # (endpoint, seconds, ok)
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def user(number):
+        rng = random.Random(seed * 1000 + number)
+        client = Client(base_url)
+        local = []
+        while time.monotonic() < deadline:
+            kind = rng.choices(kinds, weights)[0]
+            if kind in AUTHENTICATED and not client.logged_in:
+                client.login(context['username'].format(n=number % context['users']), context['password'])
+            started = time.perf_counter()
+            try:
+                endpoint, status = ACTIONS[kind](client, rng, context)
+                ok = status < 400
+            except Exception:
+                endpoint, ok = kind, False
+            local.append((endpoint, time.perf_counter() - started, ok))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=user, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, time.perf_counter() - started)
+
+def summarize(samples, elapsed):
+    by_endpoint = {}
+    for endpoint, seconds, ok in samples:
+        by_endpoint.setdefault(endpoint, []).append((seconds, ok))
+    by_endpoint['all'] = [(seconds, ok) for _, seconds, ok in samples]
+    report = {}
+    for endpoint, values in sorted(by_endpoint.items()):
+        latencies = sorted(seconds * 1000 for seconds, _ in values)
+        report[endpoint] = {
+            'requests': len(values),
+            'errors': sum(1 for _, ok in values if not ok),
+            'throughput_rps': round(len(values) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'max_ms': round(latencies[-1], 2)
+        }
+    return report
+
+def print_report(report):
+    print(f'{"endpoint":<16} {"requests":>9} {"errors":>7} {"req/s":>8} {"p50":>9} {"p95":>9} {"p99":>9} {"max":>9}')
+    for endpoint, row in report.items():
+        print(f'{endpoint:<16} {row["requests"]:>9} {row["errors"]:>7} {row["throughput_rps"]:>8.1f} '
+              f'{row["p50_ms"]:>7.1f}ms {row["p95_ms"]:>7.1f}ms {row["p99_ms"]:>7.1f}ms {row["max_ms"]:>7.1f}ms')
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if Client(base_url).request('GET', '/login')[0] == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server at {base_url} did not start')
+
+def serve(args):
+    """Serve the seeded database in ``args.directory`` (run in a subprocess by ``run``)."""
+    from werkzeug.serving import make_server
+    from app import create_app
+    from database import db
+    from synthetic_data import synthetic_config
+
+    app = create_app({
+        **synthetic_config(args.directory),
+        # Plain HTTP on localhost
+        'SESSION_COOKIE_SECURE': False
+    })
+    if args.processes > 1:
+        # The forking server forks per connection; warm the parent so children
+        # start with compiled templates and first-request work done
+        client = app.test_client()
+        for path in ('/', '/wiki/1', '/search?query=rain', '/search?use_location=true&latitude=20&longitude=80'):
+            client.get(path)
+        with app.app_context():
+            db.engine.dispose()  # SQLite connections must not be shared with the children
+    threaded = args.processes == 1
+    make_server('127.0.0.1', args.port, app, threaded=threaded, processes=args.processes).serve_forever()
+
+def run(args):
+    mix = parse_mix(args.mix)
+    context = {'wikis': args.wikis, 'users': 20, 'username': args.username, 'password': args.password}
+    server = None
+    with tempfile.TemporaryDirectory() as directory:
+        if args.url:
+            base_url = args.url.rstrip('/')
+        else:
+            from synthetic_data import create_seeded_app, write_water_level_csv, PASSWORD
+            print(f'Seeding {args.points} water points and {args.wikis} wikis...')
+            create_seeded_app(directory, points=args.points, wikis=args.wikis, seed=args.seed)
+            context.update(username='user{n}', password=PASSWORD)
+            port = free_port()
+            base_url = f'http://127.0.0.1:{port}'
+            env = dict(os.environ, EXCEL_FILE_PATH=write_water_level_csv(
+                os.path.join(directory, 'import.csv'), args.points, seed=args.seed + 1
+            ))
+            server = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), 'serve', '--directory', directory,
+                 '--port', str(port), '--processes', str(args.server_processes)],
+                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        try:
+            wait_until_up(base_url)
+            print(f'{args.clients} clients for {args.seconds:g}s against {base_url}, mix {args.mix}')
+            report = run_load(base_url, mix, args.clients, args.seconds, context, args.seed)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'created_at': datetime.utcnow().isoformat(),
+                'parameters': {
+                    'clients': args.clients, 'seconds': args.seconds, 'mix': args.mix, 'points': args.points,
+                    'wikis': args.wikis, 'server_processes': args.server_processes, 'url': args.url
+                },
+                'endpoints': report
+            }, f, indent=2)
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if baseline['parameters'] != current['parameters']:
+        print(f'Note: parameters differ\n  baseline: {baseline["parameters"]}\n  current:  {current["parameters"]}')
+
+    def change(old, new):
+        return f'{(new / old - 1):+.0%}' if old else 'n/a'
+
+    print(f'{"endpoint":<16} {"req/s":>17} {"p50 ms":>19} {"p95 ms":>19} {"p99 ms":>19}')
+    for endpoint, new in current['endpoints'].items():
+        old = baseline['endpoints'].get(endpoint)
+        if old is None:
+            continue
+        cells = [f'{old["throughput_rps"]:>6.1f}>{new["throughput_rps"]:<6.1f}{change(old["throughput_rps"], new["throughput_rps"]):>5}']
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            cells.append(f'{old[key]:>7.1f}>{new[key]:<7.1f}{change(old[key], new[key]):>5}')
+        print(f'{endpoint:<16} ' + ' '.join(cells))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='generate load and report latency per endpoint')
+    run_parser.add_argument('--clients', type=int, default=16)
+    run_parser.add_argument('--seconds', type=float, default=20)
+    run_parser.add_argument('--mix', default=DEFAULT_MIX, help=f'weighted traffic kinds (default {DEFAULT_MIX})')
+    run_parser.add_argument('--points', type=int, default=50000, help='seeded water level points')
+    run_parser.add_argument('--wikis', type=int, default=2000, help='seeded wikis')
+    run_parser.add_argument('--server-processes', type=int, default=1,
+                            help='forked server processes, each holding one connection at a time; '
+                                 '1 serves with threads')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--url', help='load an already running server instead of a seeded one')
+    run_parser.add_argument('--username', default='user0', help='login for --url create/import traffic')
+    run_parser.add_argument('--password', default='password')
+    run_parser.add_argument('--output', help='write the report to this JSON file')
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser('compare', help='compare two JSON reports')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.set_defaults(handler=compare)
+
+    serve_parser = commands.add_parser('serve')
+    serve_parser.add_argument('--directory', required=True)
+    serve_parser.add_argument('--port', type=int, required=True)
+    serve_parser.add_argument('--processes', type=int, default=1)
+    serve_parser.set_defaults(handler=serve)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
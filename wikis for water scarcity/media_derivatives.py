@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+import threading
+
+# Responsive widths; the smallest doubles as the listing thumbnail
+DERIVATIVE_WIDTHS = (320, 800, 1600)
+DERIVATIVE_FORMAT = 'webp'
+DERIVATIVE_QUALITY = 80
+
+def derivative_name(name, width):
+    """``ab/cd/<hash>.png`` -> ``ab/cd/<hash>_320.webp``."""
+    return f'{name.rsplit(".", 1)[0]}_{width}.{DERIVATIVE_FORMAT}'
+
+def generate_derivatives(store, name, widths=DERIVATIVE_WIDTHS):
+    """Write resized WebP copies of the stored image ``name``.
+
+    Returns ``(original_width, {width: derivative_name})``. Widths at or above
+    the original's are skipped. Files that already exist are kept, so an
+    interrupted run can simply be repeated.
+    """
+    # Imported here so the app runs without Pillow; images then keep only their original
+    from PIL import Image, ImageOps
+
+    with Image.open(store.path(name)) as image:
+        original_width = image.width
+        wanted = sorted((width for width in widths if width < original_width), reverse=True)
+        missing = [width for width in wanted if not os.path.exists(store.path(derivative_name(name, width)))]
+        if missing:
+            # Let JPEG decode at reduced scale when even the largest size is much smaller
+            image.draft('RGB', (missing[0], missing[0] * image.height // image.width))
+            resized = ImageOps.exif_transpose(image)
+            resized = resized.convert('RGBA' if 'A' in resized.getbands() or 'transparency' in resized.info else 'RGB')
+            # Largest first, each size resized from the previous one
+            for width in missing:
+                height = max(1, round(resized.height * width / resized.width))
+                resized = resized.resize((width, height), Image.LANCZOS)
+                _save_atomically(resized, store.path(derivative_name(name, width)))
+    return original_width, {width: derivative_name(name, width) for width in sorted(wanted)}
+
+def _save_atomically(image, path):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            image.save(temp_file, DERIVATIVE_FORMAT.upper(), quality=DERIVATIVE_QUALITY, method=4)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+class DerivativeRunner:
+    """Generates image derivatives on a local thread pool, once per stored file.
+
+    ``record(content_hash, original_width, derivatives)`` is called inside the
+    app context with the result, or with ``derivatives=None`` on failure.
+    Without Pillow nothing is recorded, so the images are picked up again
+    once it is installed.
+    """
+
+    def __init__(self, store, record, max_workers=2):
+        self.store = store
+        self.record = record
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='derivatives')
+        self._queued = set()
+        self._lock = threading.Lock()
+
+    def submit(self, app, content_hash, name):
+        """Queue ``name`` unless the same content is already queued or running."""
+        with self._lock:
+            if content_hash in self._queued:
+                return False
+            self._queued.add(content_hash)
+        self._executor.submit(self._run, app, content_hash, name)
+        return True
+
+    def _run(self, app, content_hash, name):
+        try:
+            try:
+                original_width, derivatives = generate_derivatives(self.store, name)
+            except ImportError:
+                app.logger.warning('Pillow is not installed; skipping image derivatives')
+                return
+            except Exception as e:
+                app.logger.error(f'Derivatives for {name} failed: {str(e)}')
+                original_width, derivatives = None, None
+            with app.app_context():
+                self.record(content_hash, original_width, derivatives)
+        except Exception as e:
+            app.logger.error(f'Recording derivatives for {name} failed: {str(e)}')
+        finally:
+            with self._lock:
+                self._queued.discard(content_hash)
\ No newline at end of file
@@ -0,0 +1,160 @@
+from flask import current_app, request, abort
+from werkzeug.http import is_resource_modified, parse_date
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+from datetime import datetime, timezone
+import mimetypes
+import os
+import uuid
+from media_store import is_stored_name
+
+READ_SIZE = 64 * 1024
+# More ranges than this are answered with the whole file (RFC 7233 allows ignoring Range)
+MAX_RANGES = 16
+
+def media_etag(filename, stat):
+    # Content-addressed names already identify their bytes
+    if is_stored_name(filename):
+        return os.path.basename(filename).rsplit('.', 1)[0]
+    return f'{int(stat.st_mtime)}-{stat.st_size}'
+
+def satisfiable_ranges(header_ranges, length):
+    """Clamp parsed ``(start, stop)`` ranges to ``length``, merging overlaps; [] if none fit."""
+    ranges = []
+    for start, stop in header_ranges:
+        if start < 0:
+            start, stop = max(length + start, 0), length
+        stop = length if stop is None else min(stop, length)
+        if start < stop:
+            ranges.append((start, stop))
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+def _if_range_matches(etag, last_modified):
+    header = request.headers.get('If-Range')
+    if not header:
+        return True
+    if header.startswith(('"', 'W/')):
+        # Strong comparison only
+        return header == f'"{etag}"'
+    date = parse_date(header)
+    return date is not None and int(last_modified.timestamp()) <= int(date.timestamp())
+
+def _read_range(file, start, stop):
+    file.seek(start)
+    remaining = stop - start
+    while remaining > 0:
+        chunk = file.read(min(READ_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+def send_media(root, filename, accel_prefix=None):
+    """Serve ``filename`` from ``root`` with conditional and Range support.
+
+    With ``accel_prefix`` the body is left to nginx through
+    ``X-Accel-Redirect``, and with Flask's ``USE_X_SENDFILE`` to Apache or
+    lighttpd through ``X-Sendfile``. Otherwise whole files and ranges that
+    run to the end of the file go out through the server's
+    ``wsgi.file_wrapper``, which servers such as gunicorn turn into
+    ``sendfile``.
+    """
+    path = safe_join(root, filename)
+    if path is None:
+        abort(404)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        abort(404)
+    if not os.path.isfile(path):
+        abort(404)
+
+    response_class = current_app.response_class
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    etag = media_etag(filename, stat)
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), timezone.utc)
+    length = stat.st_size
+
+    def finish(response):
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.accept_ranges = 'bytes'
+        if is_stored_name(filename):
+            response.cache_control.public = True
+            response.cache_control.max_age = 365 * 24 * 3600
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return finish(response_class(status=304))
+
+    if accel_prefix or current_app.config.get('USE_X_SENDFILE'):
+        # The front-end server reads the file and handles Range itself
+        response = finish(response_class(mimetype=mimetype))
+        if accel_prefix:
+            response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + filename
+        else:
+            response.headers['X-Sendfile'] = path
+        return response
+
+    ranges = None
+    if request.range and request.range.units == 'bytes' and _if_range_matches(etag, last_modified):
+        ranges = satisfiable_ranges(request.range.ranges, length)
+        if not ranges:
+            response = finish(response_class(status=416))
+            response.headers['Content-Range'] = f'bytes */{length}'
+            return response
+        if len(ranges) > MAX_RANGES:
+            ranges = None
+
+    file = open(path, 'rb')
+    if not ranges or ranges == [(0, length)]:
+        response = response_class(wrap_file(request.environ, file), mimetype=mimetype, direct_passthrough=True)
+        response.content_length = length
+        return finish(response)
+
+    if len(ranges) == 1:
+        start, stop = ranges[0]
+        if stop == length:
+            # Servers that sendfile a wrapped file start at its current offset
+            file.seek(start)
+            body = wrap_file(request.environ, file)
+        else:
+            body = _read_range(file, start, stop)
+        response = response_class(body, status=206, mimetype=mimetype, direct_passthrough=True)
+        response.content_length = stop - start
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+        response.call_on_close(file.close)
+        return finish(response)
+
+    # Several ranges: multipart/byteranges with each part read straight from the file
+    boundary = uuid.uuid4().hex
+    heads = [
+        (f'--{boundary}\r\nContent-Type: {mimetype}\r\n'
+         f'Content-Range: bytes {start}-{stop - 1}/{length}\r\n\r\n').encode()
+        for start, stop in ranges
+    ]
+    tail = f'\r\n--{boundary}--\r\n'.encode()
+
+    def body():
+        for index, (start, stop) in enumerate(ranges):
+            yield (b'\r\n' if index else b'') + heads[index]
+            yield from _read_range(file, start, stop)
+        yield tail
+
+    response = response_class(body(), status=206, direct_passthrough=True)
+    response.content_type = f'multipart/byteranges; boundary={boundary}'
+    response.content_length = (
+        sum(len(head) for head in heads) + 2 * (len(ranges) - 1)
+        + sum(stop - start for start, stop in ranges) + len(tail)
+    )
+    response.call_on_close(file.close)
+    return finish(response)
\ No newline at end of file
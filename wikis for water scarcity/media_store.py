@@ -0,0 +1,176 @@
+from flask import Request, current_app
+import hashlib
+import os
+import re
+import tempfile
+import uuid
+
+CHUNK_SIZE = 1024 * 1024
+HEADER_SIZE = 16
+
+# ab/cd/<64 hex digits>.<ext>, or ab/cd/<64 hex digits>_<width>.webp for derivatives
+STORED_NAME = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(_[0-9]+)?\.[a-z0-9]+$')
+
+# Leading bytes accepted for each extension
+SIGNATURES = {
+    'jpg': (b'\xff\xd8',),
+    'jpeg': (b'\xff\xd8',),
+    'png': (b'\x89PNG',),
+    'gif': (b'GIF',),
+    'mp4': (b'\x00\x00\x00',),
+    'webm': (b'\x1a\x45\xdf\xa3',)
+}
+
+class InvalidUpload(ValueError):
+    pass
+
+class UploadStream:
+    """Upload target that hashes, sizes and keeps the header of a file as it is written.
+
+    Chunks go straight to a temporary file in the upload folder, so each byte
+    is handled once and memory use does not grow with the file. The file is
+    removed on ``close`` unless ``claim`` handed it over first.
+    """
+
+    def __init__(self, directory):
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, suffix='.upload')
+        self._file = os.fdopen(fd, 'w+b')
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+        self.header = b''
+
+    def write(self, data):
+        if len(self.header) < HEADER_SIZE:
+            self.header += data[:HEADER_SIZE - len(self.header)]
+        self._sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    @property
+    def digest(self):
+        return self._sha256.hexdigest()
+
+    def claim(self):
+        """Close the file and return its path; the caller now owns it."""
+        self._file.close()
+        path, self.temp_path = self.temp_path, None
+        return path
+
+    def close(self):
+        self._file.close()
+        if self.temp_path:
+            try:
+                os.unlink(self.temp_path)
+            except OSError:
+                pass
+            self.temp_path = None
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __getattr__(self, name):
+        # read, readline, seek, tell, ... for code that reads the upload back
+        return getattr(self._file, name)
+
+class UploadRequest(Request):
+    """Request that streams uploaded files into ``UploadStream``s in the upload folder."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadStream(current_app.config['UPLOAD_FOLDER'])
+
+def check_signature(header, extension):
+    if not header.startswith(SIGNATURES.get(extension.lower(), (b'',))):
+        raise InvalidUpload(f'File content does not look like .{extension}')
+
+class MediaStore:
+    """Uploaded files stored under the SHA-256 of their content.
+
+    Files live at ``ab/cd/abcd...ef.ext`` below ``root``, so a name never has
+    to be probed for, identical uploads share one file, and a stored file
+    never changes once written. Shared files are never deleted while in use;
+    ``delete_if_stale`` removes them in a separate garbage collection pass.
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+
+    def init_app(self, app):
+        """Store files in ``app``'s ``UPLOAD_FOLDER``."""
+        self.root = app.config['UPLOAD_FOLDER']
+        app.extensions['media_store'] = self
+
+    def name_for(self, digest, extension):
+        return f'{digest[:2]}/{digest[2:4]}/{digest}.{extension.lower()}'
+
+    def path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def save(self, file, extension):
+        """Store an uploaded ``FileStorage`` and return ``(name, digest, size)``.
+
+        Uploads parsed by ``UploadRequest`` are already hashed and on disk and
+        are only renamed into place; other streams are copied once.
+        Content that is already stored is not written again, but its mtime is
+        refreshed so garbage collection spares it. Raises ``InvalidUpload`` if
+        the content does not match ``extension``.
+        """
+        upload = file.stream
+        if not isinstance(upload, UploadStream):
+            upload = UploadStream(self.root)
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                upload.write(chunk)
+        try:
+            check_signature(upload.header, extension)
+            name = self.name_for(upload.digest, extension)
+            path = self.path(name)
+            temp_path = upload.claim()
+            try:
+                os.utime(path)
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+            return name, upload.digest, upload.size
+        finally:
+            upload.close()
+
+    def delete(self, name):
+        try:
+            os.remove(self.path(name))
+        except OSError:
+            pass  # File might not exist
+
+    def stored_names(self):
+        """Names of every content-addressed file below ``root``."""
+        for directory, _, files in os.walk(self.root):
+            for filename in files:
+                name = os.path.relpath(os.path.join(directory, filename), self.root).replace(os.sep, '/')
+                if is_stored_name(name):
+                    yield name
+
+    def delete_if_stale(self, name, before):
+        """Delete ``name`` unless it was saved (or saved again) at or after the ``before`` timestamp.
+
+        The file is moved aside before its mtime is checked a second time, so
+        a concurrent ``save`` of the same content either refreshed the mtime
+        first, and the file is put back, or finds it gone and writes it anew.
+        Returns whether the file was deleted.
+        """
+        path = self.path(name)
+        doomed = f'{path}.{uuid.uuid4().hex}.delete'
+        try:
+            if os.stat(path).st_mtime >= before:
+                return False
+            os.rename(path, doomed)
+        except FileNotFoundError:
+            return False
+        if os.stat(doomed).st_mtime >= before:
+            # Any file a racing save wrote meanwhile has the same content
+            os.replace(doomed, path)
+            return False
+        os.unlink(doomed)
+        return True
+
+def is_stored_name(name):
+    """Whether ``name`` is a content-addressed path, and so safe to cache forever."""
+    return bool(STORED_NAME.match(name))
\ No newline at end of file
@@ -0,0 +1,127 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+import uuid
+
+MIGRATIONS_TABLE = 'schema_migrations'
+
+# (version, name, upgrade); append new migrations, never edit applied ones
+MIGRATIONS = []
+
+def migration(version, name):
+    def register(upgrade):
+        MIGRATIONS.append((version, name, upgrade))
+        return upgrade
+    return register
+
+def _columns(connection, table):
+    return {column['name'] for column in inspect(connection).get_columns(table)}
+
+def _has_table(connection, table):
+    return inspect(connection).has_table(table)
+
+@migration(1, 'wiki_validators')
+def add_wiki_validators(connection):
+    columns = _columns(connection, 'wiki')
+    if 'last_modified' not in columns:
+        connection.execute(text('ALTER TABLE wiki ADD COLUMN last_modified DATETIME'))
+        connection.execute(text('UPDATE wiki SET last_modified = date_posted'))
+    if 'version' not in columns:
+        connection.execute(text('ALTER TABLE wiki ADD COLUMN version INTEGER NOT NULL DEFAULT 1'))
+
+@migration(2, 'media_content_hash')
+def add_media_content_hash(connection):
+    columns = _columns(connection, 'wiki_media')
+    if 'content_hash' not in columns:
+        connection.execute(text('ALTER TABLE wiki_media ADD COLUMN content_hash VARCHAR(64)'))
+    if 'size' not in columns:
+        connection.execute(text('ALTER TABLE wiki_media ADD COLUMN size INTEGER'))
+
+@migration(3, 'media_derivatives')
+def add_media_derivatives(connection):
+    columns = _columns(connection, 'wiki_media')
+    for name, type_ in (('width', 'INTEGER'), ('derivatives', 'TEXT'),
+                        ('derivatives_status', 'VARCHAR(10)'), ('thumbnail', 'VARCHAR(255)')):
+        if name not in columns:
+            connection.execute(text(f'ALTER TABLE wiki_media ADD COLUMN {name} {type_}'))
+
+@migration(4, 'listing_indexes')
+def add_listing_indexes(connection):
+    # Equality filters first, then the listing order, so filtered pages are
+    # read in order straight from the index without a sort
+    statements = [
+        'CREATE INDEX IF NOT EXISTS ix_wiki_date_posted_id ON wiki (date_posted, id)',
+        'CREATE INDEX IF NOT EXISTS ix_wiki_last_modified ON wiki (last_modified)',
+        'CREATE INDEX IF NOT EXISTS ix_wiki_category_date_posted_id ON wiki (category, date_posted, id)',
+        'CREATE INDEX IF NOT EXISTS ix_wiki_scarcity_date_posted_id ON wiki (water_scarcity_level, date_posted, id)',
+        'CREATE INDEX IF NOT EXISTS ix_wiki_category_scarcity_date_posted_id '
+        'ON wiki (category, water_scarcity_level, date_posted, id)',
+        'CREATE INDEX IF NOT EXISTS ix_wiki_user_id ON wiki (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_wiki_media_wiki_id ON wiki_media (wiki_id)',
+        'CREATE INDEX IF NOT EXISTS ix_wiki_media_content_hash ON wiki_media (content_hash)',
+        'CREATE INDEX IF NOT EXISTS ix_wiki_media_derivatives_status ON wiki_media (derivatives_status)'
+    ]
+    for statement in statements:
+        connection.execute(text(statement))
+
+@migration(5, 'water_level_coords_index')
+def add_water_level_coords_index(connection):
+    # Imports index each staging table; tables created by create_all have none
+    if not _has_table(connection, 'water_level_data'):
+        return
+    indexes = inspect(connection).get_indexes('water_level_data')
+    if not any(index['column_names'][:2] == ['latitude', 'longitude'] for index in indexes):
+        # Index names follow the table through import swaps, so keep them unique
+        connection.execute(text(
+            f'CREATE INDEX ix_water_level_data_coords_{uuid.uuid4().hex[:8]} '
+            'ON water_level_data (latitude, longitude)'
+        ))
+
+def applied_versions(connection):
+    if not _has_table(connection, MIGRATIONS_TABLE):
+        return set()
+    return {row[0] for row in connection.execute(text(f'SELECT version FROM {MIGRATIONS_TABLE}'))}
+
+def pending_migrations(engine):
+    """Names of migrations not yet applied, without changing the database."""
+    with engine.connect() as connection:
+        applied = applied_versions(connection)
+    return [name for version, name, _ in sorted(MIGRATIONS, key=lambda item: item[0]) if version not in applied]
+
+def run_migrations(engine):
+    """Apply pending migrations in version order and return the names applied.
+
+    Each migration runs in its own transaction together with its version
+    row, and is written to tolerate a schema that already has its changes,
+    e.g. a database created by ``create_all`` from the current models.
+    """
+    with engine.begin() as connection:
+        connection.execute(text(
+            f'CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} '
+            '(version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at DATETIME NOT NULL)'
+        ))
+        applied = applied_versions(connection)
+
+    ran = []
+    for version, name, upgrade in sorted(MIGRATIONS, key=lambda item: item[0]):
+        if version in applied:
+            continue
+        try:
+            with engine.begin() as connection:
+                # Recording the version first opens the transaction and takes
+                # the write lock, so the DDL below commits or rolls back with it
+                # and a concurrent worker waits, then sees the version taken
+                connection.execute(
+                    text(f'INSERT INTO {MIGRATIONS_TABLE} (version, name, applied_at) VALUES (:version, :name, :applied_at)'),
+                    {'version': version, 'name': name, 'applied_at': datetime.utcnow()}
+                )
+                upgrade(connection)
+        except IntegrityError:
+            continue  # Another worker applied it first
+        ran.append(name)
+    return ran
+
+def query_plan(connection, statement, parameters=None):
+    """``EXPLAIN QUERY PLAN`` detail lines for a SQLite statement."""
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters or ())
+    return [row[-1] for row in rows]
\ No newline at end of file
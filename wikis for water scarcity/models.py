@@ -0,0 +1,172 @@
+from flask import current_app, url_for
+from flask_login import UserMixin
+from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import datetime
+import json
+import os
+import re
+import time
+from database import db
+from extensions import media_store
+from media_derivatives import DerivativeRunner
+from wiki_search import register_search_index
+
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(128))
+    wikis = db.relationship('Wiki', backref='author', lazy=True)
+
+    def set_password(self, password):
+        self.password_hash = generate_password_hash(password)
+
+    def check_password(self, password):
+        return check_password_hash(self.password_hash, password)
+
+class WikiMedia(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    file_type = db.Column(db.String(10), nullable=False)  # 'image' or 'video'
+    wiki_id = db.Column(db.Integer, db.ForeignKey('wiki.id'), nullable=False, index=True)
+    # Rows sharing a content hash share one stored file; files uploaded before
+    # content addressing have no hash and belong to a single row
+    content_hash = db.Column(db.String(64), index=True)
+    size = db.Column(db.Integer)
+    # Resized copies of images, filled in by derivative_jobs
+    width = db.Column(db.Integer)
+    derivatives = db.Column(db.Text)  # JSON {width: filename}
+    derivatives_status = db.Column(db.String(10), index=True)  # 'pending', 'done', 'failed'
+    thumbnail = db.Column(db.String(255))
+
+    @property
+    def srcset(self):
+        """``srcset`` listing the resized copies and the original, or None if there are none."""
+        derivatives = json.loads(self.derivatives) if self.derivatives else {}
+        if not derivatives:
+            return None
+        sources = sorted([(int(width), name) for width, name in derivatives.items()] + [(self.width, self.filename)])
+        return ', '.join(f"{url_for('main.media', filename=name)} {width}w" for width, name in sources)
+
+class Wiki(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(100), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    media_files = db.relationship('WikiMedia', backref='wiki', lazy=True, cascade='all, delete-orphan')
+    water_scarcity_level = db.Column(db.String(20), nullable=False)  # 'low', 'moderate', 'high'
+    category = db.Column(db.String(20), nullable=False)  # 'agriculture', 'domestic', 'business'
+    # Validators for conditional GETs; bumped by touch() whenever the page changes
+    last_modified = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    # Kept in step with the listing_indexes migration, which adds them to existing databases
+    __table_args__ = (
+        db.Index('ix_wiki_date_posted_id', 'date_posted', 'id'),  # keyset pagination order
+        db.Index('ix_wiki_last_modified', 'last_modified'),  # newest change for listing validators
+        db.Index('ix_wiki_category_date_posted_id', 'category', 'date_posted', 'id'),
+        db.Index('ix_wiki_scarcity_date_posted_id', 'water_scarcity_level', 'date_posted', 'id'),
+        db.Index('ix_wiki_category_scarcity_date_posted_id', 'category', 'water_scarcity_level', 'date_posted', 'id'),
+        db.Index('ix_wiki_user_id', 'user_id'),
+    )
+
+    def touch(self):
+        """Mark the wiki as changed, including changes to its media only."""
+        self.last_modified = datetime.utcnow()
+        self.version = Wiki.version + 1
+
+    def delete(self):
+        released = [(media.filename, media.content_hash) for media in self.media_files]
+        db.session.delete(self)
+        db.session.commit()
+        release_media_files(released)
+
+register_search_index(Wiki)
+
+def media_file_type(filename):
+    return 'image' if filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif'} else 'video'
+
+def store_media(file, wiki):
+    """Store an upload by content hash and return a new ``WikiMedia`` for ``wiki``.
+
+    Raises ``InvalidUpload`` if the content does not match the file extension.
+    """
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    filename, content_hash, size = media_store.save(file, extension)
+    media = WikiMedia(
+        filename=filename, file_type=media_file_type(file.filename),
+        content_hash=content_hash, size=size, wiki=wiki
+    )
+    if media.file_type == 'image':
+        # Identical content may already have its derivatives
+        done = WikiMedia.query.filter_by(content_hash=content_hash, derivatives_status='done').first()
+        if done:
+            media.width, media.derivatives, media.thumbnail = done.width, done.derivatives, done.thumbnail
+            media.derivatives_status = 'done'
+        else:
+            media.derivatives_status = 'pending'
+    return media
+
+def record_derivatives(content_hash, original_width, derivatives):
+    """Save derivative results on every row sharing the content and refresh their pages."""
+    rows = WikiMedia.query.filter_by(content_hash=content_hash).all()
+    for media in rows:
+        media.width = original_width
+        if derivatives is None:
+            media.derivatives_status = 'failed'
+            continue
+        media.derivatives = json.dumps(derivatives)
+        media.derivatives_status = 'done'
+        # Images narrower than the smallest size are their own thumbnail
+        media.thumbnail = derivatives[min(derivatives)] if derivatives else media.filename
+    # New versions give the pages new fragment cache keys and validators
+    wiki_ids = {media.wiki_id for media in rows}
+    for wiki in Wiki.query.filter(Wiki.id.in_(wiki_ids)):
+        wiki.touch()
+    db.session.commit()
+
+derivative_jobs = DerivativeRunner(media_store, record_derivatives, max_workers=int(os.getenv('DERIVATIVE_WORKERS', 2)))
+
+def queue_derivatives(media_files):
+    for media in media_files:
+        if media.derivatives_status == 'pending':
+            derivative_jobs.submit(current_app._get_current_object(), media.content_hash, media.filename)
+
+def release_media_files(released):
+    """Delete the files of removed media rows, given committed-away ``(filename, content_hash)`` pairs.
+
+    Only files from before content addressing belong to a single row.
+    Content-addressed files may be shared with other rows and with images
+    embedded in wiki content, so they are left to ``collect_unreferenced_media``.
+    """
+    for filename, content_hash in released:
+        if content_hash is None:
+            media_store.delete(filename)
+
+# Content hash within a stored media name or URL, e.g. in wiki content
+MEDIA_REFERENCE = re.compile(r'[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})')
+
+def referenced_media_hashes():
+    """Content hashes of every stored file a media row or wiki content refers to."""
+    rows = db.session.query(WikiMedia.content_hash).filter(WikiMedia.content_hash.isnot(None))
+    hashes = {row.content_hash for row in rows}
+    for row in db.session.query(Wiki.content).yield_per(500):
+        hashes.update(MEDIA_REFERENCE.findall(row.content))
+    return hashes
+
+def collect_unreferenced_media(grace_seconds=24 * 3600):
+    """Delete content-addressed files (and their derivatives) that nothing refers to.
+
+    Files saved within the last ``grace_seconds`` are kept, so an editor
+    upload whose wiki has not been saved yet survives. Returns the number of
+    files deleted.
+    """
+    # Taken before reading references: anything referenced later was saved later
+    before = time.time() - grace_seconds
+    referenced = referenced_media_hashes()
+    deleted = 0
+    for name in media_store.stored_names():
+        if name.rsplit('/', 1)[1][:64] not in referenced and media_store.delete_if_stale(name, before):
+            deleted += 1
+    return deleted
\ No newline at end of file
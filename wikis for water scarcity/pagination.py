@@ -0,0 +1,104 @@
+from datetime import datetime
+from sqlalchemy import and_, or_
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+class KeysetPage:
+    """One page of a keyset-paginated listing."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, page_size=DEFAULT_PAGE_SIZE):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.page_size = page_size
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict) and '$dt' in value:
+        return datetime.fromisoformat(value['$dt'])
+    return value
+
+def encode_cursor(keys, values, direction):
+    payload = {
+        's': [name for name, _, _ in keys],
+        'k': [_encode_value(value) for value in values],
+        'd': direction
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(keys, cursor):
+    """Return ``(values, direction)`` from a cursor, raising ValueError if it is malformed or for another ordering."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [_decode_value(value) for value in payload['k']]
+        direction = payload['d']
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f'Invalid cursor: {e}')
+    if payload.get('s') != [name for name, _, _ in keys] or direction not in ('next', 'prev'):
+        raise ValueError('Cursor does not match this listing')
+    if len(values) != len(keys):
+        raise ValueError('Cursor does not hold a value for every key')
+    return values, direction
+
+def _after(keys, values, reverse):
+    """Condition selecting rows strictly after ``values`` in the keys' ordering."""
+    clauses = []
+    for i, (_, expression, descending) in enumerate(keys):
+        forward = expression < values[i] if descending != reverse else expression > values[i]
+        ties = [keys[j][1] == values[j] for j in range(i)]
+        clauses.append(and_(*ties, forward))
+    return or_(*clauses)
+
+def page_size_arg(value, default=DEFAULT_PAGE_SIZE):
+    """Clamp a requested page size to ``1..MAX_PAGE_SIZE``."""
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return default
+
+def paginate(query, keys, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """Return a ``KeysetPage`` of ``query`` ordered by ``keys``.
+
+    ``keys`` is a list of ``(name, expression, descending)`` tuples whose
+    combined values are unique per row (end with the primary key). Each page
+    seeks past the cursor's key values instead of using OFFSET, so deep pages
+    cost the same as the first one.
+    """
+    direction = 'next'
+    single_entity = len(query.column_descriptions) == 1
+    if cursor:
+        values, direction = decode_cursor(keys, cursor)
+        query = query.filter(_after(keys, values, reverse=direction == 'prev'))
+
+    reverse = direction == 'prev'
+    ordering = [
+        expression.desc() if descending != reverse else expression.asc()
+        for _, expression, descending in keys
+    ]
+    rows = query.add_columns(*[expression.label(f'_key_{name}') for name, expression, _ in keys]) \
+        .order_by(*ordering).limit(page_size + 1).all()
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+
+    key_count = len(keys)
+    key_values = [list(row[-key_count:]) for row in rows]
+    items = [row[0] if single_entity else row for row in rows]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or reverse:
+            next_cursor = encode_cursor(keys, key_values[-1], 'next')
+        if (has_more and reverse) or (cursor and not reverse):
+            prev_cursor = encode_cursor(keys, key_values[0], 'prev')
+    return KeysetPage(items, next_cursor, prev_cursor, page_size)
\ No newline at end of file
@@ -0,0 +1,199 @@
+from flask import abort, current_app, g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from contextlib import contextmanager
+import hmac
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Statements kept per request for the slow-request log
+MAX_LOGGED_STATEMENTS = 50
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.label_names = name, help, labels
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{_labels(self.label_names, labels)} {_number(value)}')
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name, self.help, self.label_names, self.buckets = name, help, labels, buckets
+        self.values = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, labels, value):
+        series = self.values.setdefault(labels, [0] * len(self.buckets) + [0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", bound)])} {count}')
+            lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", "+Inf")])} {series[-1]}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {_number(series[-2])}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {series[-1]}')
+        return lines
+
+class RequestStats:
+    """What one request spent its time on; kept on ``g`` while it runs."""
+
+    def __init__(self, keep_statements):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.statements = [] if keep_statements else None
+
+    def add_statement(self, statement, seconds):
+        self.sql_count += 1
+        self.sql_seconds += seconds
+        if self.statements is not None and len(self.statements) < MAX_LOGGED_STATEMENTS:
+            self.statements.append((statement, seconds))
+
+def current_stats():
+    return g.get('request_stats') if has_request_context() else None
+
+@contextmanager
+def timed_render():
+    """Count the enclosed rendering, e.g. a macro call, as template time."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = current_stats()
+        if stats is not None:
+            stats.template_seconds += time.perf_counter() - started
+
+class TimedTemplate(Template):
+    def render(self, *args, **kwargs):
+        with timed_render():
+            return super().render(*args, **kwargs)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Background jobs run without a request context and are not counted
+    stats = current_stats()
+    started = getattr(context, '_query_started', None)
+    if stats is not None and started is not None:
+        stats.add_statement(statement, time.perf_counter() - started)
+
+class Metrics:
+    """Per-endpoint metrics of one app, in the Prometheus text format."""
+
+    def __init__(self):
+        labels = ('endpoint', 'method')
+        self.requests = Counter('wiki_requests_total', 'Requests handled.', labels + ('status',))
+        self.latency = Histogram('wiki_request_duration_seconds', 'Time to build the response.', labels, LATENCY_BUCKETS)
+        self.sql_queries = Histogram('wiki_request_sql_queries', 'SQL statements run per request.', labels, QUERY_COUNT_BUCKETS)
+        self.sql_seconds = Counter('wiki_request_sql_seconds_total', 'Time spent executing SQL.', labels)
+        self.template_seconds = Counter('wiki_request_template_seconds_total', 'Time spent rendering templates.', labels)
+        self.response_size = Histogram('wiki_response_size_bytes', 'Response body size.', labels, SIZE_BUCKETS)
+        self._lock = threading.Lock()
+
+    def record(self, labels, status, elapsed, stats, size):
+        with self._lock:
+            self.requests.inc(labels + (str(status),))
+            self.latency.observe(labels, elapsed)
+            self.sql_queries.observe(labels, stats.sql_count)
+            self.sql_seconds.inc(labels, stats.sql_seconds)
+            self.template_seconds.inc(labels, stats.template_seconds)
+            if size is not None:
+                self.response_size.observe(labels, size)
+
+    def expose(self):
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.latency, self.sql_queries, self.sql_seconds,
+                           self.template_seconds, self.response_size):
+                lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+class RequestMetrics:
+    """Times every request and serves the results at ``/metrics``.
+
+    Metrics are kept per process, so with several workers each scrape sees
+    the worker that answered it. ``/metrics`` answers 404 unless
+    ``METRICS_TOKEN`` is set, and then only to requests carrying it as a
+    bearer token. Requests slower than ``SLOW_REQUEST_SECONDS`` are logged
+    with the SQL they ran.
+    """
+
+    def init_app(self, app):
+        app.config.setdefault('SLOW_REQUEST_SECONDS', None)
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.jinja_env.template_class = TimedTemplate
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.extensions['request_metrics'] = Metrics()
+
+    def _start(self):
+        g.request_stats = RequestStats(keep_statements=current_app.config['SLOW_REQUEST_SECONDS'] is not None)
+
+    def _finish(self, response):
+        stats = g.pop('request_stats', None)
+        if stats is None or request.endpoint == 'metrics':
+            return response
+        elapsed = time.perf_counter() - stats.started
+        size = response.content_length
+        if size is None and not response.is_streamed:
+            size = response.calculate_content_length()
+        current_app.extensions['request_metrics'].record(
+            (request.endpoint or 'unmatched', request.method), response.status_code, elapsed, stats, size
+        )
+
+        threshold = current_app.config['SLOW_REQUEST_SECONDS']
+        if threshold is not None and elapsed >= threshold:
+            statements = '\n'.join(
+                f'  {seconds * 1000:.1f}ms {" ".join(statement.split())}' for statement, seconds in stats.statements
+            )
+            current_app.logger.warning(
+                f'Slow request: {request.method} {request.full_path.rstrip("?")} -> {response.status_code} '
+                f'in {elapsed * 1000:.1f}ms; {stats.sql_count} SQL statements in {stats.sql_seconds * 1000:.1f}ms, '
+                f'templates {stats.template_seconds * 1000:.1f}ms' + (f'\n{statements}' if statements else '')
+            )
+        return response
+
+    def metrics_view(self):
+        token = current_app.config['METRICS_TOKEN']
+        if not token:
+            abort(404)
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+            return current_app.response_class('Unauthorized', 401, {'WWW-Authenticate': 'Bearer'})
+        return current_app.response_class(
+            current_app.extensions['request_metrics'].expose(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
\ No newline at end of file
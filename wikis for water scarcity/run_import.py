@@ -1,9 +1,12 @@
-from app import app
-from import_excel import import_excel_data
+from app import create_app
+from database import db
+from import_jobs import import_jobs
 import os
+import sys
+import time
 from dotenv import load_dotenv
 
-def run_import():
+def run_import(incremental=False):
     load_dotenv()
     excel_path = os.getenv('EXCEL_FILE_PATH')
     
@@ -15,18 +18,37 @@ def run_import():
         print(f'Error: Excel file not found at path: {excel_path}')
         return
     
+    print(f'Importing data from: {excel_path}')
+    app = create_app()
     with app.app_context():
-        print(f'Importing data from: {excel_path}')
-        result = import_excel_data(excel_path)
-        
-        if result['success']:
-            print(f'Successfully imported {result["imported_count"]} records')
-            if result['error_rows']:
-                print('\nErrors in rows:')
-                for error in result['error_rows']:
-                    print(f'Row {error["row"]}: {error["error"]}')
-        else:
-            print(f'Import failed: {result["error"]}')
+        job_id = import_jobs.submit(app, excel_path, incremental=incremental).id
+        last_progress = None
+        while True:
+            time.sleep(0.5)
+            # End the read transaction so the next poll sees the job's latest row
+            db.session.rollback()
+            status = import_jobs.status(job_id)
+            if status['progress'] != last_progress:
+                last_progress = status['progress']
+                print('Progress: ' + ', '.join(f'{name.replace("_", " ")} {count}' for name, count in last_progress.items()))
+            if status['status'] in ('succeeded', 'failed'):
+                break
+
+    result = status['result']
+    if result.get('skipped'):
+        print('File unchanged since the last import; nothing to do')
+    elif result['success']:
+        if incremental:
+            print(f'Added {result["added"]}, changed {result["changed"]}, '
+                  f'removed {result["removed"]}, unchanged {result["unchanged"]} records')
+        print(f'Successfully imported {result["imported_count"]} records '
+              f'in {result["elapsed_seconds"]}s ({result["rows_per_second"]} rows/s)')
+        if result['error_rows']:
+            print('\nErrors in rows:')
+            for error in result['error_rows']:
+                print(f'Row {error["row"]}: {error["error"]}')
+    else:
+        print(f'Import failed: {result["error"]}')
 
 if __name__ == '__main__':
-    run_import()
\ No newline at end of file
+    run_import(incremental='--incremental' in sys.argv[1:])
\ No newline at end of file
@@ -0,0 +1,161 @@
+from flask import current_app
+import math
+import os
+import threading
+import numpy as np
+from spatial_index import SpatialIndex
+from water_level_index import database_id, get_spatial_index
+from water_level_snapshot import read_snapshot, remove_stale_generations, write_snapshot
+
+# Grid cells queried per nearest-neighbour batch while building
+BUILD_BATCH = 65536
+MAX_CELLS = 50 * 1000 * 1000
+
+def fit_bounds(latitudes, longitudes, resolution):
+    """Smallest grid-aligned ``(lat_min, lat_max, lon_min, lon_max)`` covering the points."""
+    def down(value):
+        return math.floor(value / resolution) * resolution
+
+    def up(value):
+        return (math.floor(value / resolution) + 1) * resolution
+
+    return (
+        max(-90.0, down(float(np.min(latitudes)))), min(90.0, up(float(np.max(latitudes)))),
+        max(-180.0, down(float(np.min(longitudes)))), min(180.0, up(float(np.max(longitudes))))
+    )
+
+def grid_shape(bounds, resolution):
+    lat_min, lat_max, lon_min, lon_max = bounds
+    return max(1, round((lat_max - lat_min) / resolution)), max(1, round((lon_max - lon_min) / resolution))
+
+def interpolate_grid(latitudes, longitudes, water_levels, bounds, resolution,
+                     neighbours=8, power=2.0, max_distance_km=None, index=None):
+    """Inverse-distance-weighted water levels at the centre of every grid cell.
+
+    Each cell averages its ``neighbours`` nearest wells weighted by
+    ``1 / distance ** power``; a cell on top of a well takes its reading.
+    Cells whose nearest well is further than ``max_distance_km`` are NaN.
+    Returns a float32 array of shape ``grid_shape(bounds, resolution)``.
+    """
+    rows, cols = grid_shape(bounds, resolution)
+    if rows * cols > MAX_CELLS:
+        raise ValueError(f'Scarcity raster of {rows}x{cols} cells is too large; use a coarser resolution')
+    water_levels = np.asarray(water_levels, dtype=np.float64)
+    index = index or SpatialIndex(latitudes, longitudes)
+    k = min(neighbours, len(index))
+    lat_min, _, lon_min, _ = bounds
+    cell_lats = lat_min + (np.arange(rows) + 0.5) * resolution
+    cell_lons = lon_min + (np.arange(cols) + 0.5) * resolution
+
+    grid = np.full(rows * cols, np.nan, dtype=np.float32)
+    if not k:
+        return grid.reshape(rows, cols)
+    for start in range(0, rows * cols, BUILD_BATCH):
+        cells = np.arange(start, min(start + BUILD_BATCH, rows * cols))
+        distances, positions = index.query(cell_lats[cells // cols], cell_lons[cells % cols], k=k)
+        with np.errstate(divide='ignore'):
+            weights = 1.0 / distances ** power
+        exact = distances[:, 0] == 0
+        weights[exact] = 0
+        weights[exact, 0] = 1
+        values = (weights * water_levels[positions]).sum(axis=1) / weights.sum(axis=1)
+        if max_distance_km is not None:
+            values[distances[:, 0] > max_distance_km] = np.nan
+        grid[cells] = values
+    return grid.reshape(rows, cols)
+
+class ScarcityRaster:
+    """Interpolated water levels on a lat/lon grid, read from a memory-mapped file."""
+
+    def __init__(self, generation, bounds, resolution, values):
+        self.generation = generation
+        self.bounds = tuple(bounds)
+        self.resolution = resolution
+        self.values = values
+
+    def cells(self, lat, lon):
+        """Flat cell numbers for coordinate arrays; -1 outside the grid."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        lat_min, _, lon_min, _ = self.bounds
+        rows, cols = self.values.shape
+        row = np.floor((lat - lat_min) / self.resolution)
+        col = np.floor((lon - lon_min) / self.resolution)
+        inside = (row >= 0) & (row < rows) & (col >= 0) & (col < cols)
+        return np.where(inside, row * cols + col, -1).astype(np.int64)
+
+    def water_levels(self, lat, lon):
+        """Interpolated water levels for coordinate arrays; NaN where the grid has none."""
+        cells = self.cells(lat, lon)
+        levels = np.full(cells.shape, np.nan, dtype=np.float64)
+        inside = cells >= 0
+        levels[inside] = self.values.reshape(-1)[cells[inside]]
+        return levels
+
+    def water_level(self, lat, lon):
+        """Interpolated water level at one coordinate, or None."""
+        level = float(self.water_levels([lat], [lon])[0])
+        return None if math.isnan(level) else level
+
+def raster_path(directory, generation):
+    return os.path.join(directory, f'scarcity_raster.{generation}.snapshot')
+
+def write_raster(directory, generation, grid, bounds, resolution):
+    os.makedirs(directory, exist_ok=True)
+    write_snapshot(
+        raster_path(directory, generation), {'values': grid},
+        bounds=list(bounds), resolution=resolution, database=database_id()
+    )
+
+def open_raster(directory, generation):
+    """Memory-map the raster of ``generation``, or None if it has not been built."""
+    snapshot = read_snapshot(raster_path(directory, generation))
+    if snapshot is None:
+        return None
+    meta, arrays = snapshot
+    if meta.get('database') != database_id():
+        return None
+    return ScarcityRaster(generation, meta['bounds'], meta['resolution'], arrays['values'])
+
+def build_scarcity_raster():
+    """Interpolate the current water level data with the app's raster settings and write it.
+
+    Returns the grid shape, or None when there is no data to interpolate.
+    """
+    config = current_app.config
+    directory = config['WATER_DATA_DIR']
+    index = get_spatial_index()
+    if not len(index):
+        if os.path.isdir(directory):
+            remove_stale_generations(directory, 'scarcity_raster', keep={index.generation - 1})
+        return None
+    resolution = config['SCARCITY_RASTER_RESOLUTION']
+    bounds = config['SCARCITY_RASTER_BOUNDS'] or fit_bounds(index.latitudes, index.longitudes, resolution)
+    grid = interpolate_grid(
+        index.latitudes, index.longitudes, index.water_levels, bounds, resolution,
+        neighbours=config['SCARCITY_RASTER_NEIGHBOURS'], power=config['SCARCITY_RASTER_POWER'],
+        max_distance_km=config['SCARCITY_RASTER_MAX_DISTANCE_KM'], index=index
+    )
+    write_raster(directory, index.generation, grid, bounds, resolution)
+    # Workers still on the previous generation may be reading its file
+    remove_stale_generations(directory, 'scarcity_raster', keep={index.generation, index.generation - 1})
+    return grid.shape
+
+_raster_lock = threading.Lock()
+_raster = None
+
+def get_scarcity_raster(generation):
+    """This process's mapping of the raster for ``generation``, or None until it is built."""
+    global _raster
+    key = (current_app.config['WATER_DATA_DIR'], generation)
+    raster = _raster
+    if raster is not None and raster.key == key:
+        return raster
+    with _raster_lock:
+        if _raster is None or _raster.key != key:
+            raster = open_raster(*key)
+            if raster is None:
+                return None
+            raster.key = key
+            _raster = raster
+        return _raster
\ No newline at end of file
@@ -0,0 +1,222 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0  # Earth's radius in kilometers
+
+def to_unit_vectors(lat, lon):
+    """Convert latitude/longitude degrees to x/y/z points on the unit sphere."""
+    lat = np.radians(np.atleast_1d(np.asarray(lat, dtype=np.float64)))
+    lon = np.radians(np.atleast_1d(np.asarray(lon, dtype=np.float64)))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+def chord_to_km(squared_chord):
+    """Convert squared chord lengths on the unit sphere to great-circle kilometers."""
+    squared_chord = np.asarray(squared_chord, dtype=np.float64)
+    chord = np.sqrt(np.minimum(squared_chord, 4.0))
+    return np.where(np.isinf(squared_chord), np.inf, 2 * EARTH_RADIUS_KM * np.arcsin(chord / 2))
+
+class SpatialIndex:
+    """KD-tree over water level points projected onto the unit sphere.
+
+    Chord length between unit vectors grows monotonically with the Haversine
+    distance, so nearest neighbours in x/y/z space are nearest on the globe.
+    The tree is stored as flat arrays in heap order (children of node ``i``
+    are ``2i + 1`` and ``2i + 2``) and queries are evaluated for whole batches
+    of coordinates at once.
+    """
+
+    def __init__(self, latitudes, longitudes, leaf_size=16):
+        self.latitudes = np.ascontiguousarray(latitudes, dtype=np.float64)
+        self.longitudes = np.ascontiguousarray(longitudes, dtype=np.float64)
+        self.size = len(self.latitudes)
+        self.leaf_size = max(2, int(leaf_size))
+        if self.size:
+            self._build(to_unit_vectors(self.latitudes, self.longitudes))
+
+    # Flat tree arrays, saved and restored by ``arrays``/``from_arrays``
+    TREE_ARRAYS = ('order', 'split_axis', 'split_value', 'points', 'leaf_start', 'leaf_count', 'leaf_slots', 'lo', 'hi')
+
+    def __len__(self):
+        return self.size
+
+    def arrays(self):
+        """The coordinates and built tree as named arrays, e.g. for saving to a file."""
+        arrays = {'latitudes': self.latitudes, 'longitudes': self.longitudes}
+        if self.size:
+            arrays.update((name, getattr(self, f'_{name}')) for name in self.TREE_ARRAYS)
+            arrays['shape'] = np.array([self._depth, self._n_leaves, self.leaf_size], dtype=np.int64)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild an index from ``arrays()`` output without copying or re-sorting the points."""
+        index = cls.__new__(cls)
+        index._restore(arrays)
+        return index
+
+    def _restore(self, arrays):
+        self.latitudes = arrays['latitudes']
+        self.longitudes = arrays['longitudes']
+        self.size = len(self.latitudes)
+        self.leaf_size = 16
+        if self.size:
+            self._depth, self._n_leaves, self.leaf_size = (int(value) for value in arrays['shape'])
+            for name in self.TREE_ARRAYS:
+                setattr(self, f'_{name}', arrays[name])
+
+    def _build(self, points):
+        n = self.size
+        depth = max(0, int(np.ceil(np.log2(n / self.leaf_size)))) if n > self.leaf_size else 0
+        order = np.arange(n)
+        split_axis = np.zeros((1 << depth) - 1, dtype=np.int64)
+        split_value = np.full((1 << depth) - 1, np.inf)
+        ranges = [(0, n)]
+        node = 0
+        for _ in range(depth):
+            next_ranges = []
+            for start, end in ranges:
+                mid = (start + end) // 2
+                if end - start > 1:
+                    segment = order[start:end]
+                    coords = points[segment]
+                    axis = np.argmax(coords.max(axis=0) - coords.min(axis=0))
+                    split = np.argpartition(coords[:, axis], mid - start)
+                    order[start:end] = segment[split]
+                    split_axis[node] = axis
+                    split_value[node] = coords[split[mid - start], axis]
+                node += 1
+                next_ranges.append((start, mid))
+                next_ranges.append((mid, end))
+            ranges = next_ranges
+
+        self._depth = depth
+        self._n_leaves = len(ranges)
+        self._order = order
+        self._split_axis = split_axis
+        self._split_value = split_value
+        self._points = points[order]
+        self._leaf_start = np.array([start for start, _ in ranges], dtype=np.int64)
+        self._leaf_count = np.array([end - start for start, end in ranges], dtype=np.int64)
+        self._leaf_slots = np.arange(self._leaf_count.max())
+
+        n_nodes = 2 * self._n_leaves - 1
+        lo = np.empty((n_nodes, 3))
+        hi = np.empty((n_nodes, 3))
+        first_leaf = self._n_leaves - 1
+        lo[first_leaf:] = np.minimum.reduceat(self._points, self._leaf_start, axis=0)
+        hi[first_leaf:] = np.maximum.reduceat(self._points, self._leaf_start, axis=0)
+        for level in range(depth - 1, -1, -1):
+            nodes = np.arange((1 << level) - 1, (1 << (level + 1)) - 1)
+            lo[nodes] = np.minimum(lo[2 * nodes + 1], lo[2 * nodes + 2])
+            hi[nodes] = np.maximum(hi[2 * nodes + 1], hi[2 * nodes + 2])
+        self._lo = lo
+        self._hi = hi
+
+    def _box_distance(self, points, nodes):
+        """Squared distance from each point to the bounding box of its node."""
+        gap = np.maximum(self._lo[nodes] - points, 0) + np.maximum(points - self._hi[nodes], 0)
+        return np.einsum('ij,ij->i', gap, gap)
+
+    def _scan_leaves(self, points, leaves):
+        """Squared distances from each point to every slot of its leaf."""
+        slots = self._leaf_start[leaves][:, None] + self._leaf_slots
+        valid = self._leaf_slots < self._leaf_count[leaves][:, None]
+        slots = np.where(valid, slots, 0)
+        diff = self._points[slots] - points[:, None, :]
+        distances = np.einsum('ijk,ijk->ij', diff, diff)
+        distances[~valid] = np.inf
+        return distances, slots
+
+    @staticmethod
+    def _merge(best_d, best_i, queries, cand_d, cand_i):
+        """Fold candidate distances into the running k-best arrays.
+
+        ``queries`` may repeat when several leaves are scanned for the same
+        coordinate in one pass, so all candidates are pooled with the current
+        best rows and the ``k`` smallest per query are kept.
+        """
+        k = best_d.shape[1]
+        if cand_d.shape[1] > k:
+            top = np.argpartition(cand_d, k - 1, axis=1)[:, :k]
+            cand_d = np.take_along_axis(cand_d, top, axis=1)
+            cand_i = np.take_along_axis(cand_i, top, axis=1)
+        if k == 1:
+            # Single nearest neighbour: an unbuffered minimum per query, no sorting
+            nearest = best_d[:, 0]
+            np.minimum.at(nearest, queries, cand_d[:, 0])
+            won = (cand_d[:, 0] == nearest[queries]) & np.isfinite(cand_d[:, 0])
+            best_i[queries[won], 0] = cand_i[won, 0]
+            return
+        touched = np.unique(queries)
+        pool_q = np.concatenate((np.repeat(touched, k), np.repeat(queries, cand_d.shape[1])))
+        pool_d = np.concatenate((best_d[touched].ravel(), cand_d.ravel()))
+        pool_i = np.concatenate((best_i[touched].ravel(), cand_i.ravel()))
+        order = np.lexsort((pool_d, pool_q))
+        pool_q, pool_d, pool_i = pool_q[order], pool_d[order], pool_i[order]
+        group_starts = np.flatnonzero(np.r_[True, pool_q[1:] != pool_q[:-1]])
+        group_sizes = np.diff(np.r_[group_starts, len(pool_q)])
+        rank = np.arange(len(pool_q)) - np.repeat(group_starts, group_sizes)
+        keep = rank < k
+        best_d[pool_q[keep], rank[keep]] = pool_d[keep]
+        best_i[pool_q[keep], rank[keep]] = pool_i[keep]
+
+    def query(self, lat, lon, k=1):
+        """Find the ``k`` nearest points for each coordinate.
+
+        Returns ``(distances_km, positions)`` arrays of shape ``(m, k)`` where
+        ``positions`` index into the arrays the index was built from. Rows are
+        sorted nearest first; missing neighbours (``k`` larger than the index)
+        are reported as ``inf`` distance and position ``-1``.
+        """
+        queries = to_unit_vectors(lat, lon)
+        m = len(queries)
+        best_d = np.full((m, k), np.inf)
+        best_i = np.full((m, k), -1, dtype=np.int64)
+        if not self.size or not m:
+            return chord_to_km(best_d), best_i
+
+        first_leaf = self._n_leaves - 1
+        everyone = np.arange(m)
+
+        # Seed every query with its home leaf so the pruning bound is tight
+        # before the full traversal starts. Every other leaf lies beyond one
+        # of the split planes passed on the way down, so queries whose k-th
+        # distance is within the nearest of those planes are already done.
+        nodes = np.zeros(m, dtype=np.int64)
+        margin = np.full(m, np.inf)
+        for _ in range(self._depth):
+            offset = queries[everyone, self._split_axis[nodes]] - self._split_value[nodes]
+            margin = np.minimum(margin, np.abs(offset))
+            nodes = 2 * nodes + np.where(offset < 0, 1, 2)
+        home_leaf = nodes
+        cand_d, cand_i = self._scan_leaves(queries, home_leaf - first_leaf)
+        self._merge(best_d, best_i, everyone, cand_d, cand_i)
+
+        frontier_q = everyone[best_d[:, -1] > margin ** 2]
+        frontier_n = np.zeros(len(frontier_q), dtype=np.int64)
+        while len(frontier_q):
+            lower_bound = self._box_distance(queries[frontier_q], frontier_n)
+            keep = lower_bound < best_d[frontier_q, -1]
+            frontier_q, frontier_n = frontier_q[keep], frontier_n[keep]
+
+            is_leaf = frontier_n >= first_leaf
+            leaf_q, leaf_n = frontier_q[is_leaf], frontier_n[is_leaf]
+            unseen = leaf_n != home_leaf[leaf_q]
+            leaf_q, leaf_n = leaf_q[unseen], leaf_n[unseen]
+            if len(leaf_q):
+                cand_d, cand_i = self._scan_leaves(queries[leaf_q], leaf_n - first_leaf)
+                self._merge(best_d, best_i, leaf_q, cand_d, cand_i)
+
+            inner_q, inner_n = frontier_q[~is_leaf], frontier_n[~is_leaf]
+            frontier_q = np.concatenate((inner_q, inner_q))
+            frontier_n = np.concatenate((2 * inner_n + 1, 2 * inner_n + 2))
+
+        positions = np.where(best_i >= 0, self._order[np.maximum(best_i, 0)], -1)
+        return chord_to_km(best_d), positions
+
+    def nearest(self, lat, lon):
+        """Return ``(distance_km, position)`` of the closest point, or ``None``."""
+        distances, positions = self.query(lat, lon, k=1)
+        if positions[0, 0] < 0:
+            return None
+        return float(distances[0, 0]), int(positions[0, 0])
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""Reproducible synthetic water level points and wikis for benchmarks and load tests."""
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+import csv
+import os
+import random
+from app import create_app
+from database import db
+from models import User, Wiki
+from water_level_data import WaterLevelData, bump_data_generation
+from wiki_search import rebuild_search_index
+
+# Roughly the extent of India, where the real well data comes from
+LATITUDE_RANGE = (8.0, 35.0)
+LONGITUDE_RANGE = (68.0, 97.0)
+WATER_LEVEL_RANGE = (0.0, 20.0)
+
+CATEGORIES = ('agriculture', 'domestic', 'business')
+SCARCITY_LEVELS = ('low', 'moderate', 'high')
+WORDS = (
+    'rainwater harvesting drip irrigation groundwater recharge borewell aquifer tank pond '
+    'reuse greywater conservation drought monsoon canal reservoir filtration storage supply '
+    'village city farm crop mulching check dam watershed leakage meter pricing'
+).split()
+PASSWORD = 'password'
+
+def random_coordinates(rng, n):
+    """``n`` (latitude, longitude) pairs inside the data extent."""
+    return [(rng.uniform(*LATITUDE_RANGE), rng.uniform(*LONGITUDE_RANGE)) for _ in range(n)]
+
+def water_points(n, seed=0):
+    """``n`` (latitude, longitude, water_level) rows."""
+    rng = random.Random(seed)
+    return [(lat, lon, round(rng.uniform(*WATER_LEVEL_RANGE), 2)) for lat, lon in random_coordinates(rng, n)]
+
+def write_water_level_csv(path, n, seed=0):
+    """Write ``n`` points in the import file layout and return ``path``."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['latitude', 'longitude', 'water_level'])
+        writer.writerows(water_points(n, seed))
+    return path
+
+def wiki_text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def seed_water_points(n, seed=0):
+    """Insert ``n`` points; call inside an app context."""
+    db.session.execute(WaterLevelData.__table__.insert(), [
+        {'latitude': lat, 'longitude': lon, 'water_level': level} for lat, lon, level in water_points(n, seed)
+    ])
+    db.session.commit()
+    bump_data_generation()
+
+def seed_wikis(m, users=20, seed=0, paragraphs=5):
+    """Insert ``users`` authors sharing ``PASSWORD`` and ``m`` wikis spread over them.
+
+    Rows are inserted in bulk, bypassing ORM events, so the search index is
+    rebuilt afterwards. Call inside an app context.
+    """
+    rng = random.Random(seed)
+    password_hash = generate_password_hash(PASSWORD)
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': password_hash}
+        for i in range(users)
+    ])
+    user_ids = [row[0] for row in db.session.query(User.id)]
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(m):
+        posted = start + timedelta(minutes=i)
+        rows.append({
+            'title': wiki_text(rng, 4).capitalize(),
+            'content': ''.join(f'<p>{wiki_text(rng, 60)}</p>' for _ in range(paragraphs)),
+            'date_posted': posted,
+            'last_modified': posted,
+            'version': 1,
+            'user_id': rng.choice(user_ids),
+            'water_scarcity_level': rng.choice(SCARCITY_LEVELS),
+            'category': rng.choice(CATEGORIES)
+        })
+    for offset in range(0, len(rows), 5000):
+        db.session.execute(Wiki.__table__.insert(), rows[offset:offset + 5000])
+    db.session.commit()
+    rebuild_search_index()
+
+def synthetic_config(directory):
+    """Settings keeping the database, uploads, caches and data files of an app inside ``directory``."""
+    return {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(directory, "synthetic.db")}',
+        'UPLOAD_FOLDER': os.path.join(directory, 'uploads'),
+        'FRAGMENT_CACHE_PATH': os.path.join(directory, 'fragment_cache.db'),
+        'WATER_DATA_DIR': os.path.join(directory, 'water_data')
+    }
+
+def create_seeded_app(directory, points=0, wikis=0, seed=0, config=None):
+    """An app on a new SQLite database in ``directory`` filled with synthetic data."""
+    app = create_app({**synthetic_config(directory), **(config or {})})
+    with app.app_context():
+        if points:
+            seed_water_points(points, seed)
+        if wikis:
+            seed_wikis(wikis, seed=seed)
+        db.session.remove()
+    return app
\ No newline at end of file
@@ -0,0 +1,9 @@
+from benchmark_hot_paths import run_benchmarks, compare, SEARCH_CASES
+
+def test_benchmarks_run_on_a_small_database(tmp_path):
+    results = run_benchmarks(str(tmp_path), points=200, wikis=20, repeat=1)
+    assert set(SEARCH_CASES) <= set(results)
+    assert results['render_wiki_list_20']['calls'] == 10
+    assert results['import_csv']['rows'] == 200
+    # Comparing a run with itself flags nothing
+    assert not any('REGRESSION' in line for line in compare(results, results))
\ No newline at end of file
@@ -0,0 +1,86 @@
+from datetime import datetime
+from sqlalchemy import event
+import pytest
+from database import db
+from models import User, Wiki
+
+@pytest.fixture
+def app(app):
+    with app.app_context():
+        user = User(username='author', email='author@example.com')
+        db.session.add(user)
+        db.session.add(Wiki(
+            title='Drip irrigation', content='<p>Save water</p>', author=user,
+            water_scarcity_level='high', category='agriculture'
+        ))
+        db.session.commit()
+        db.session.remove()
+    return app
+
+@pytest.mark.parametrize('path', ['/wiki/1', '/', '/search?query=drip', '/search?query=drip&use_location=false'])
+def test_revalidation_returns_304_with_one_query(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    statements = []
+    with client.application.app_context():
+        engine = db.engine
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        revalidated = client.get(path, headers={'If-None-Match': etag})
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert len(statements) == 1
+
+def test_only_wiki_pages_revalidate_by_date(client):
+    response = client.get('/wiki/1')
+    modified_since = client.get('/wiki/1', headers={'If-Modified-Since': response.headers['Last-Modified']})
+    assert modified_since.status_code == 304
+
+    # Deleting an older wiki leaves the newest change time alone, so listings have no date to revalidate by
+    with client.application.app_context():
+        db.session.add(Wiki(
+            title='Mulching', content='<p>Keep soil moist</p>', author=User.query.first(),
+            water_scarcity_level='low', category='agriculture', last_modified=datetime(2020, 1, 1)
+        ))
+        db.session.commit()
+    listing = client.get('/')
+    assert b'Mulching' in listing.data
+    assert 'Last-Modified' not in listing.headers
+    with client.application.app_context():
+        db.session.execute(db.text("DELETE FROM wiki WHERE title = 'Mulching'"))
+        db.session.commit()
+    assert client.get('/', headers={'If-Modified-Since': response.headers['Last-Modified']}).status_code == 200
+    assert client.get('/', headers={'If-None-Match': listing.headers['ETag']}).status_code == 200
+
+def test_touch_changes_validators(client):
+    etag = client.get('/wiki/1').headers['ETag']
+    listing_etag = client.get('/').headers['ETag']
+    with client.application.app_context():
+        wiki = Wiki.query.get(1)
+        wiki.touch()
+        db.session.commit()
+        assert wiki.version == 2
+    assert client.get('/wiki/1', headers={'If-None-Match': etag}).status_code == 200
+    assert client.get('/', headers={'If-None-Match': listing_etag}).status_code == 200
+
+def test_changes_made_by_another_worker_are_not_served_stale(client):
+    assert b'Drip irrigation' in client.get('/wiki/1').data
+    assert b'Drip irrigation' in client.get('/').data
+    # Another worker edits the wiki; this worker's fragment cache is not told
+    with client.application.app_context():
+        wiki = Wiki.query.get(1)
+        wiki.title = 'Sprinkler irrigation'
+        wiki.touch()
+        db.session.commit()
+    assert b'Sprinkler irrigation' in client.get('/wiki/1').data
+    assert b'Sprinkler irrigation' in client.get('/').data
+
+    with client.application.app_context():
+        db.session.execute(db.text('DELETE FROM wiki'))
+        db.session.commit()
+    assert b'Sprinkler irrigation' not in client.get('/').data
\ No newline at end of file
@@ -0,0 +1,71 @@
+from datetime import datetime
+from fragment_cache import FragmentCache, MemoryCacheBackend, SqliteCacheBackend, LRU_REFRESH_SECONDS
+
+def test_get_or_render_caches_per_wiki_version():
+    cache = FragmentCache(MemoryCacheBackend())
+    calls = []
+
+    def render():
+        calls.append(1)
+        return {'header': f'<h1>render {len(calls)}</h1>'}
+
+    assert cache.get_or_render(cache.wiki_key(1, 1, 'anonymous'), render) == {'header': '<h1>render 1</h1>'}
+    assert cache.get_or_render(cache.wiki_key(1, 1, 'anonymous'), render) == {'header': '<h1>render 1</h1>'}
+    assert cache.get_or_render(cache.wiki_key(1, 2, 'anonymous'), render) == {'header': '<h1>render 2</h1>'}
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 2
+
+def test_listing_keys_change_with_the_listed_wikis(tmp_path):
+    cache = FragmentCache(SqliteCacheBackend(str(tmp_path / 'cache.db')))
+    params = {'query': 'rain', 'per_page': '5'}
+    changed = datetime(2024, 1, 1)
+    before = cache.listing_key('search', 'anonymous', params, changed, 3)
+    assert before == cache.listing_key('search', 'anonymous', dict(reversed(params.items())), changed, 3)
+    assert before != cache.listing_key('search', 'authenticated', params, changed, 3)
+    assert before != cache.listing_key('search', 'anonymous', params, changed, 2)
+    assert before != cache.listing_key('search', 'anonymous', params, datetime(2024, 1, 2), 3)
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryCacheBackend(max_bytes=10)
+    backend.set('a', '12345')
+    backend.set('b', '12345')
+    backend.get('a')
+    backend.set('c', '12345')
+    assert backend.get('a') == '12345'
+    assert backend.get('b') is None
+    assert backend.size == 10
+def test_memory_backend_caps_utf8_bytes():
+    backend = MemoryCacheBackend(max_bytes=10)
+    backend.set('a', 'ééé')
+    assert backend.size == 6
+    backend.set('b', 'ééé')
+    assert backend.get('a') is None
+    assert backend.size == 6
+
+def test_sqlite_backend_tracks_its_size(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    backend = SqliteCacheBackend(path, max_bytes=10)
+    backend.set('a', '12345')
+    backend.set('b', '123')
+    backend.set('b', '1234')
+    assert backend.size == 9
+    backend.get('a')
+    backend.set('c', 'é')
+    assert (backend.get('a'), backend.get('b'), backend.get('c')) == (None, '1234', 'é')
+    assert backend.size == 6
+    backend.delete('b')
+    backend.delete('missing')
+    assert backend.size == 2
+    # Another worker opening the same file sees the same total
+    assert SqliteCacheBackend(path, max_bytes=10).size == 2
+
+def test_sqlite_backend_hits_rarely_write(tmp_path):
+    backend = SqliteCacheBackend(str(tmp_path / 'cache.db'))
+    backend.set('a', 'fragment')
+    used = lambda: backend._connect().execute("SELECT used FROM fragments WHERE key = 'a'").fetchone()[0]
+    stored = used()
+    assert backend.get('a') == 'fragment'
+    assert used() == stored
+    backend._connect().execute('UPDATE fragments SET used = used - ?', (LRU_REFRESH_SECONDS + 1,))
+    backend.get('a')
+    assert used() > stored
\ No newline at end of file
@@ -0,0 +1,158 @@
+import time
+import pandas as pd
+import pytest
+from database import db
+from import_excel import (
+    IMPORT_LOCK_KEY, STAGING_PREFIX, ImportLocked, detect_file_format, import_excel_data, import_lock,
+    read_water_level_data, rollback_water_level_data, validate_frame
+)
+from import_jobs import ImportJobRunner
+from water_level_data import WaterLevelData, get_data_generation, get_meta_value, set_meta_value
+
+@pytest.fixture
+def app_config():
+    # The test wells span continents; keep the rebuilt raster small
+    return {'SCARCITY_RASTER_RESOLUTION': 2.0}
+
+def write_csv(path, rows):
+    path.write_text('latitude,longitude,water_level\n' + ''.join(f'{row}\n' for row in rows))
+    return str(path)
+
+def test_import_lock_is_shared_through_the_database(app):
+    with app.app_context():
+        with import_lock():
+            assert get_meta_value(IMPORT_LOCK_KEY)
+            with pytest.raises(ImportLocked):
+                with import_lock(wait=0):
+                    pass
+        assert get_meta_value(IMPORT_LOCK_KEY) is None
+
+        # A lock past its expiry was left by a dead worker and is taken over
+        set_meta_value(IMPORT_LOCK_KEY, '0 deadworker')
+        db.session.commit()
+        with import_lock(wait=0):
+            assert not get_meta_value(IMPORT_LOCK_KEY).endswith('deadworker')
+
+def test_import_drops_abandoned_staging_tables(app, tmp_path):
+    with app.app_context():
+        db.session.execute(db.text(f'CREATE TABLE {STAGING_PREFIX}abandoned (id INTEGER)'))
+        db.session.commit()
+        assert import_excel_data(write_csv(tmp_path / 'levels.csv', ['13.0,80.2,12.4']))['success']
+        tables = db.inspect(db.engine).get_table_names()
+        assert not [name for name in tables if name.startswith(STAGING_PREFIX)]
+        assert WaterLevelData.query.count() == 1
+
+def test_job_status_is_visible_to_other_workers(app, tmp_path):
+    with app.app_context():
+        job_id = ImportJobRunner().submit(app, write_csv(tmp_path / 'levels.csv', ['13.0,80.2,12.4', '91,0,1'])).id
+
+        # Another worker polls the job from the database
+        other_worker = ImportJobRunner()
+        deadline = time.monotonic() + 10
+        while other_worker.status(job_id)['status'] not in ('succeeded', 'failed'):
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+            db.session.rollback()
+        status = other_worker.status(job_id)
+        assert status['status'] == 'succeeded'
+        assert status['result']['imported_count'] == 1
+        assert status['progress']['errors'] == 1
+        assert other_worker.status('missing') is None
+
+def test_import_is_started_with_a_post(app):
+    assert app.test_client().get('/import-data').status_code == 405
+
+def test_validate_frame_reports_first_failed_check_per_row():
+    df = pd.DataFrame({
+        'latitude': [13.0, 'x', 95, 13.0, 13.0, 10.0, 11.0],
+        'longitude': [80.2, 80.0, 80.0, 190, 80.0, 70.0, 71.0],
+        'water_level': [' 12.4', 5, 5, 5, -1, 3, 'inf']
+    })
+    valid_rows, error_rows = validate_frame(df)
+    assert valid_rows.to_dict('list') == {'latitude': [13.0, 10.0], 'longitude': [80.2, 70.0], 'water_level': [12.4, 3.0]}
+    assert error_rows == [
+        {'row': 3, 'error': 'Missing or invalid data in row'},
+        {'row': 4, 'error': 'Invalid latitude value: 95.0'},
+        {'row': 5, 'error': 'Invalid longitude value: 190.0'},
+        {'row': 6, 'error': 'Invalid water level value: -1.0'},
+        {'row': 8, 'error': 'Invalid water level value: inf'}
+    ]
+
+def live_levels():
+    return sorted(row.water_level for row in WaterLevelData.query.all())
+
+def test_failed_imports_keep_the_live_data(app, tmp_path):
+    with app.app_context():
+        assert import_excel_data(write_csv(tmp_path / 'first.csv', ['13.0,80.2,12.4', '40.7,-74.0,7.5']))['success']
+        generation = get_data_generation()
+
+        result = import_excel_data(write_csv(tmp_path / 'invalid.csv', ['91,0,1', '13.0,80.2,-3']))
+        assert not result['success'] and len(result['error_rows']) == 2
+        missing_column = tmp_path / 'missing.csv'
+        missing_column.write_text('latitude,longitude\n13.0,80.2\n')
+        assert not import_excel_data(str(missing_column))['success']
+
+        assert live_levels() == [7.5, 12.4]
+        assert get_data_generation() == generation
+        assert not [name for name in db.inspect(db.engine).get_table_names() if name.startswith(STAGING_PREFIX)]
+
+def test_rollback_swaps_the_previous_import_back(app, tmp_path):
+    with app.app_context():
+        assert not rollback_water_level_data()
+        assert import_excel_data(write_csv(tmp_path / 'first.csv', ['13.0,80.2,12.4']))['success']
+        assert import_excel_data(write_csv(tmp_path / 'second.csv', ['40.7,-74.0,7.5', '34.0,-118.2,9.8']))['success']
+        assert live_levels() == [7.5, 9.8]
+
+        assert rollback_water_level_data()
+        assert live_levels() == [12.4]
+        assert WaterLevelData.find_nearest_point(40.7, -74.0).water_level == 12.4
+        # Rolling back again restores the data that was replaced
+        assert rollback_water_level_data()
+        assert live_levels() == [7.5, 9.8]
+
+def test_incremental_import_writes_only_the_delta(app, tmp_path):
+    with app.app_context():
+        assert import_excel_data(write_csv(tmp_path / 'first.csv', ['13.0,80.2,12.4', '40.7,-74.0,7.5', '34.0,-118.2,9.8']))['success']
+        kept_id = WaterLevelData.query.filter_by(water_level=7.5).one().id
+
+        path = write_csv(tmp_path / 'second.csv', ['13.0,80.2,3.1', '40.7,-74.0,7.5', '10.0,70.0,1.0'])
+        result = import_excel_data(path, incremental=True)
+        assert (result['added'], result['changed'], result['removed'], result['unchanged']) == (1, 1, 1, 1)
+        assert live_levels() == [1.0, 3.1, 7.5]
+        assert WaterLevelData.query.filter_by(water_level=7.5).one().id == kept_id
+        generation = get_data_generation()
+
+        # The same file again is recognised by its hash and not read
+        result = import_excel_data(path, incremental=True)
+        assert result['skipped'] and result['unchanged'] == 3
+        assert get_data_generation() == generation
+
+@pytest.mark.parametrize('file_format', ['parquet', 'arrow', 'arrow_stream'])
+def test_columnar_files_round_trip(app, tmp_path, file_format):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+
+    df = pd.DataFrame({'latitude': [13.0, 40.7, 34.0, 91.0, 10.0], 'longitude': [80.2, -74.0, -118.2, 0.0, 70.0],
+                       'water_level': [12.4, 7.5, 9.8, 1.0, 3.1]})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    path = str(tmp_path / 'levels.data')  # Detected from the content, not the extension
+    if file_format == 'parquet':
+        pq.write_table(table, path, row_group_size=2)
+    else:
+        with pa.OSFile(path, 'wb') as sink:
+            new_writer = pa.ipc.new_file if file_format == 'arrow' else pa.ipc.new_stream
+            with new_writer(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=3)
+    assert detect_file_format(path) == file_format
+
+    frames = list(read_water_level_data(path, chunk_size=2))
+    assert len(frames) > 1
+    read = pd.concat(frames)
+    assert read.index.tolist() == list(range(len(df)))
+    pd.testing.assert_frame_equal(read.reset_index(drop=True), df)
+
+    with app.app_context():
+        result = import_excel_data(path)
+        assert result['imported_count'] == 4
+        assert result['error_rows'] == [{'row': 5, 'error': 'Invalid latitude value: 91.0'}]
+        assert live_levels() == [3.1, 7.5, 9.8, 12.4]
\ No newline at end of file
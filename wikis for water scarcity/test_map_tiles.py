@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from database import db
+from extensions import fragment_cache
+from water_level_data import WaterLevelData, bump_data_generation
+from water_level_index import build_tile_cache, get_spatial_index
+from water_level_tiles import BINARY_MAGIC, BINARY_RECORD, occupied_tiles, tile_clusters, tile_coordinates
+
+@pytest.fixture
+def app_config():
+    return {'TILE_CACHE_ZOOM': 3}
+
+@pytest.fixture
+def app(app):
+    rng = np.random.default_rng(5)
+    with app.app_context():
+        db.session.add_all([
+            WaterLevelData(latitude=lat, longitude=lon, water_level=level)
+            for lat, lon, level in zip(rng.uniform(8, 35, 2000), rng.uniform(68, 97, 2000), rng.uniform(0, 20, 2000))
+        ])
+        db.session.commit()
+        bump_data_generation()
+    return app
+
+def test_clusters_match_brute_force(app):
+    with app.app_context():
+        index = get_spatial_index()
+        for z in (0, 4, 7):
+            xs, ys = tile_coordinates(index.latitudes, index.longitudes, z)
+            cell_xs, cell_ys = tile_coordinates(index.latitudes, index.longitudes, z + 3)
+            tiles = occupied_tiles(index, z)
+            assert sorted(tiles) == sorted(set(zip(xs.tolist(), ys.tolist())))
+            for x, y in tiles[:20]:
+                clusters = tile_clusters(index, z, x, y)
+                in_tile = (xs == x) & (ys == y)
+                assert sum(clusters['count']) == in_tile.sum()
+                assert len(clusters['count']) == len(set(zip(cell_xs[in_tile].tolist(), cell_ys[in_tile].tolist())))
+                assert min(clusters['min']) == pytest.approx(index.water_levels[in_tile].min(), abs=1e-3)
+
+def test_tile_endpoint(app):
+    client = app.test_client()
+    with app.app_context():
+        assert build_tile_cache() > 0
+    misses = fragment_cache.misses
+
+    response = client.get('/tiles/0/0/0')
+    assert response.mimetype == 'application/geo+json'
+    features = response.get_json()['features']
+    assert sum(feature['properties']['count'] for feature in features) == 2000
+    assert fragment_cache.misses == misses  # Precomputed after the import
+
+    body = client.get('/tiles/0/0/0?format=bin').data
+    assert body[:4] == BINARY_MAGIC
+    records = np.frombuffer(body, dtype=BINARY_RECORD, offset=8)
+    assert len(records) == int.from_bytes(body[4:8], 'little') == len(features)
+    assert records['count'].sum() == 2000
+
+    assert response.headers['Cache-Control'] == 'public, max-age=300'
+    assert 'Vary' not in response.headers
+    revalidated = client.get('/tiles/0/0/0', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['Cache-Control'] == 'public, max-age=300'
+    assert 'Vary' not in revalidated.headers
+    assert client.get('/tiles/2/4/0').status_code == 404
+    assert client.get('/tiles/10/0/0').get_json()['features'] == []
\ No newline at end of file
@@ -0,0 +1,38 @@
+import io
+import os
+import pytest
+from werkzeug.datastructures import FileStorage
+from media_store import MediaStore
+from media_derivatives import generate_derivatives
+
+Image = pytest.importorskip('PIL.Image')
+
+def store_image(store, size, fmt='JPEG', extension='jpg'):
+    data = io.BytesIO()
+    Image.new('RGB', size, (20, 120, 200)).save(data, fmt)
+    data.seek(0)
+    name, _, _ = store.save(FileStorage(stream=data, filename=f'photo.{extension}'), extension)
+    return name
+
+def test_derivatives_are_generated_once_per_width(tmp_path):
+    store = MediaStore(str(tmp_path))
+    name = store_image(store, (1000, 500))
+
+    width, derivatives = generate_derivatives(store, name)
+    assert width == 1000
+    assert sorted(derivatives) == [320, 800]
+    with Image.open(store.path(derivatives[320])) as thumbnail:
+        assert thumbnail.format == 'WEBP'
+        assert thumbnail.size == (320, 160)
+
+    # A repeated run keeps the files it finds
+    mtime = os.path.getmtime(store.path(derivatives[800]))
+    os.remove(store.path(derivatives[320]))
+    assert generate_derivatives(store, name) == (width, derivatives)
+    assert os.path.exists(store.path(derivatives[320]))
+    assert os.path.getmtime(store.path(derivatives[800])) == mtime
+
+def test_small_images_have_no_derivatives(tmp_path):
+    store = MediaStore(str(tmp_path))
+    name = store_image(store, (200, 100), 'PNG', 'png')
+    assert generate_derivatives(store, name) == (200, {})
\ No newline at end of file
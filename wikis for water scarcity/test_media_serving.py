@@ -0,0 +1,59 @@
+import pytest
+
+NAME = 'ab/cd/' + 'abcd' * 16 + '.mp4'
+DATA = bytes(range(256)) * 40
+
+@pytest.fixture
+def app_config(tmp_path):
+    (tmp_path / 'ab' / 'cd').mkdir(parents=True)
+    (tmp_path / NAME).write_bytes(DATA)
+    return {'UPLOAD_FOLDER': str(tmp_path)}
+
+def test_whole_file_and_revalidation(client):
+    response = client.get(f'/media/{NAME}')
+    assert response.status_code == 200
+    assert response.data == DATA
+    assert response.mimetype == 'video/mp4'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert 'immutable' in response.headers['Cache-Control']
+
+    cached = client.get(f'/media/{NAME}', headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+
+def test_single_ranges(client):
+    response = client.get(f'/media/{NAME}', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.data == DATA[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(DATA)}'
+
+    tail = client.get(f'/media/{NAME}', headers={'Range': 'bytes=-10'})
+    assert tail.data == DATA[-10:]
+
+    unsatisfiable = client.get(f'/media/{NAME}', headers={'Range': f'bytes={len(DATA)}-'})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers['Content-Range'] == f'bytes */{len(DATA)}'
+
+def test_multiple_ranges(client):
+    response = client.get(f'/media/{NAME}', headers={'Range': 'bytes=0-9,50-69'})
+    assert response.status_code == 206
+    assert response.mimetype == 'multipart/byteranges'
+    assert int(response.headers['Content-Length']) == len(response.data)
+    assert b'Content-Range: bytes 0-9/' in response.data
+    assert b'Content-Range: bytes 50-69/' in response.data
+    assert DATA[50:70] in response.data
+
+def test_if_range_mismatch_returns_whole_file(client):
+    response = client.get(f'/media/{NAME}', headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == DATA
+
+def test_offload_and_missing_files(client):
+    client.application.config['MEDIA_ACCEL_REDIRECT_PREFIX'] = '/protected-uploads/'
+    try:
+        response = client.get(f'/media/{NAME}')
+    finally:
+        client.application.config['MEDIA_ACCEL_REDIRECT_PREFIX'] = None
+    assert response.headers['X-Accel-Redirect'] == f'/protected-uploads/{NAME}'
+    assert response.data == b''
+    assert client.get('/media/../app.py').status_code == 404
+    assert client.get('/media/missing.mp4').status_code == 404
\ No newline at end of file
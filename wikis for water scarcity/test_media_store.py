@@ -0,0 +1,90 @@
+import io
+import os
+import time
+from werkzeug.datastructures import FileStorage
+import pytest
+from app import create_app, init_schema
+from database import db
+from extensions import media_store
+from media_store import MediaStore, UploadStream, InvalidUpload, is_stored_name
+from models import User, Wiki, collect_unreferenced_media, store_media
+
+def upload(data, filename='photo.png'):
+    return FileStorage(stream=io.BytesIO(data), filename=filename)
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = MediaStore(str(tmp_path))
+    name, digest, size = store.save(upload(b'\x89PNG same bytes'), 'png')
+    again, _, _ = store.save(upload(b'\x89PNG same bytes', 'copy.png'), 'png')
+    other, _, _ = store.save(upload(b'\x89PNG other bytes'), 'png')
+
+    assert name == again != other
+    assert name == f'{digest[:2]}/{digest[2:4]}/{digest}.png'
+    assert size == len(b'\x89PNG same bytes')
+    assert is_stored_name(name)
+    with open(store.path(name), 'rb') as f:
+        assert f.read() == b'\x89PNG same bytes'
+    assert sorted(f for _, _, files in os.walk(tmp_path) for f in files) == sorted(
+        [os.path.basename(name), os.path.basename(other)]
+    )
+
+def test_delete_and_legacy_names(tmp_path):
+    store = MediaStore(str(tmp_path))
+    name, _, _ = store.save(upload(b'GIF89a'), 'gif')
+    store.delete(name)
+    store.delete(name)
+    assert not os.path.exists(store.path(name))
+    assert not is_stored_name('photo_1.png')
+
+def test_streamed_upload_is_renamed_into_place(tmp_path):
+    stream = UploadStream(str(tmp_path))
+    for chunk in (b'\x89P', b'NG\r\n', b'rest of the image'):
+        stream.write(chunk)
+    stream.seek(0)
+    store = MediaStore(str(tmp_path))
+    name, digest, size = store.save(FileStorage(stream=stream, filename='photo.png'), 'png')
+    assert size == len(b'\x89PNG\r\nrest of the image')
+    assert os.listdir(tmp_path) == [digest[:2]]
+
+def test_mismatched_content_is_rejected_and_cleaned_up(tmp_path):
+    store = MediaStore(str(tmp_path))
+    with pytest.raises(InvalidUpload):
+        store.save(upload(b'<html>not an image</html>'), 'png')
+    assert os.listdir(tmp_path) == []
+
+def test_saving_again_keeps_a_file_from_stale_deletion(tmp_path):
+    store = MediaStore(str(tmp_path))
+    name, _, _ = store.save(upload(b'\x89PNG shared'), 'png')
+    os.utime(store.path(name), (0, 0))
+    store.save(upload(b'\x89PNG shared'), 'png')
+    assert not store.delete_if_stale(name, time.time() - 60)
+    assert os.path.exists(store.path(name))
+
+    os.utime(store.path(name), (0, 0))
+    assert store.delete_if_stale(name, time.time() - 60)
+    assert os.listdir(store.path(name).rsplit(os.sep, 1)[0]) == []
+    assert not store.delete_if_stale(name, time.time())
+
+def test_collection_keeps_media_that_rows_or_content_refer_to(tmp_path):
+    app = create_app({'UPLOAD_FOLDER': str(tmp_path), 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "media.db"}'})
+    init_schema(app)
+    with app.app_context():
+        embedded, _, _ = media_store.save(upload(b'\x89PNG embedded'), 'png')
+        orphan, _, _ = media_store.save(upload(b'\x89PNG orphan'), 'png')
+        user = User(username='author', email='author@example.com')
+        wiki = Wiki(title='Tanks', content=f'<img src="/media/{embedded}">', author=user,
+                    water_scarcity_level='low', category='domestic')
+        # The attached copy shares its file with the embedded image
+        db.session.add(store_media(upload(b'\x89PNG embedded'), wiki))
+        db.session.add(store_media(upload(b'\x89PNG attached'), wiki))
+        db.session.add(wiki)
+        db.session.commit()
+
+        assert collect_unreferenced_media() == 0  # Everything is within the grace period
+        assert collect_unreferenced_media(grace_seconds=-60) == 1
+        assert not os.path.exists(media_store.path(orphan))
+
+        wiki.media_files.clear()
+        db.session.commit()
+        assert collect_unreferenced_media(grace_seconds=-60) == 1
+        assert os.path.exists(media_store.path(embedded))
\ No newline at end of file
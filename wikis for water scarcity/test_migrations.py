@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+import sqlite3
+from sqlalchemy import create_engine, event, inspect
+import pytest
+from app import create_app
+from database import db
+from models import User, Wiki
+from migrations import run_migrations, pending_migrations, query_plan, MIGRATIONS
+from water_level_data import WaterLevelData
+
+# Schema of databases created before migrations existed
+ORIGINAL_SCHEMA = '''
+CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE,
+                   email VARCHAR(120) NOT NULL UNIQUE, password_hash VARCHAR(128));
+CREATE TABLE wiki (id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL, content TEXT NOT NULL,
+                   date_posted DATETIME NOT NULL, user_id INTEGER NOT NULL REFERENCES user (id),
+                   water_scarcity_level VARCHAR(20) NOT NULL, category VARCHAR(20) NOT NULL);
+CREATE TABLE wiki_media (id INTEGER PRIMARY KEY, filename VARCHAR(255) NOT NULL, file_type VARCHAR(10) NOT NULL,
+                         wiki_id INTEGER NOT NULL REFERENCES wiki (id));
+CREATE TABLE water_level_data (id INTEGER PRIMARY KEY, latitude FLOAT NOT NULL, longitude FLOAT NOT NULL,
+                               water_level FLOAT NOT NULL);
+INSERT INTO user (id, username, email) VALUES (1, 'author', 'author@example.com');
+INSERT INTO wiki VALUES (1, 'Old wiki', '<p>old</p>', '2023-05-01 00:00:00.000000', 1, 'high', 'domestic');
+'''
+
+@pytest.fixture
+def old_database(tmp_path):
+    path = tmp_path / 'old.db'
+    with sqlite3.connect(path) as connection:
+        connection.executescript(ORIGINAL_SCHEMA)
+    return f'sqlite:///{path}'
+
+def test_old_database_is_migrated_once(old_database):
+    engine = create_engine(old_database)
+    assert run_migrations(engine) == [name for _, name, _ in sorted(MIGRATIONS, key=lambda item: item[0])]
+    assert run_migrations(engine) == []
+
+    inspector = inspect(engine)
+    assert {'last_modified', 'version'} <= {column['name'] for column in inspector.get_columns('wiki')}
+    assert {'content_hash', 'thumbnail'} <= {column['name'] for column in inspector.get_columns('wiki_media')}
+    assert 'ix_wiki_category_scarcity_date_posted_id' in {index['name'] for index in inspector.get_indexes('wiki')}
+    with engine.connect() as connection:
+        row = connection.exec_driver_sql('SELECT last_modified, version FROM wiki').one()
+    assert row == ('2023-05-01 00:00:00.000000', 1)
+
+def test_app_start_migrates_old_database(old_database):
+    assert pending_migrations(create_engine(old_database))
+    app = create_app({'SQLALCHEMY_DATABASE_URI': old_database})
+    with app.app_context():
+        assert pending_migrations(db.engine) == []
+        db.session.remove()
+    client = app.test_client()
+    for path in ('/', '/search?category=domestic', '/wiki/1'):
+        assert client.get(path).status_code == 200, path
+
+@pytest.fixture
+def app_config(old_database):
+    # Starting the app adds the new tables and migrates the old ones
+    return {'SQLALCHEMY_DATABASE_URI': old_database}
+
+@pytest.fixture
+def app(app):
+    with app.app_context():
+        author = User.query.get(1)
+        for i in range(30):
+            db.session.add(Wiki(
+                title=f'Rainwater {i}', content='<p>rain</p>', author=author,
+                water_scarcity_level=('low', 'moderate', 'high')[i % 3],
+                category=('domestic', 'business')[i % 2],
+                date_posted=datetime(2024, 1, 1) + timedelta(hours=i)
+            ))
+        for i in range(5):
+            db.session.add(WaterLevelData(latitude=13 + i, longitude=80, water_level=5.0 * i))
+        db.session.commit()
+        db.session.remove()
+    return app
+
+HOT_PATHS = [
+    '/',
+    '/search?category=domestic',
+    '/search?query=rainwater',
+    '/search?use_location=true&latitude=13&longitude=80',
+    '/search?use_location=true&latitude=13&longitude=80&category=business',
+    '/wiki/2'
+]
+
+def test_hot_queries_use_indexes(client):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    with client.application.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        for path in HOT_PATHS:
+            assert client.get(path).status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            if not statement.startswith('SELECT') or 'FROM water_level_data' in statement:
+                continue  # The spatial index loads every point by design
+            plan = query_plan(connection, statement, parameters)
+            assert not [line for line in plan if line in ('SCAN wiki', 'SCAN user', 'SCAN wiki_media')], (statement, plan)
+            if 'wiki_fts' not in statement:
+                # Relevance order is computed per match and has to be sorted
+                assert 'USE TEMP B-TREE FOR ORDER BY' not in plan, (statement, plan)
\ No newline at end of file
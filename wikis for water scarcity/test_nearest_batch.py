@@ -0,0 +1,53 @@
+import json
+import numpy as np
+import pytest
+from database import db
+from water_level_data import WaterLevelData, bump_data_generation
+from water_level_index import scarcity_levels
+
+@pytest.fixture
+def app_config():
+    return {'NEAREST_BATCH_MAX_POINTS': 300}
+
+@pytest.fixture
+def app(app):
+    rng = np.random.default_rng(3)
+    with app.app_context():
+        db.session.add_all([
+            WaterLevelData(latitude=lat, longitude=lon, water_level=level)
+            for lat, lon, level in zip(rng.uniform(8, 35, 500), rng.uniform(68, 97, 500), rng.uniform(0, 20, 500))
+        ])
+        db.session.commit()
+        bump_data_generation()
+    return app
+
+def test_scarcity_levels_match_get_scarcity_level():
+    levels = [-1, 0, 2.5, 5, 5.01, 10, 10.5, 30]
+    assert scarcity_levels(levels).tolist() == [WaterLevelData.get_scarcity_level(level) for level in levels]
+
+def test_batch_matches_single_lookups(client):
+    points = [[lat, lon] for lat, lon in np.random.default_rng(4).uniform((8, 68), (35, 97), (200, 2))]
+    points.append([95, 80])  # Out of range
+    response = client.post('/api/nearest-wells', json={'points': points})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert len(results) == len(points)
+    assert results[-1]['well_id'] is None
+
+    with client.application.app_context():
+        for (lat, lon), result in zip(points[:-1], results):
+            nearest = WaterLevelData.find_nearest_point(lat, lon)
+            assert result['well_id'] == nearest.id
+            assert result['water_level'] == nearest.water_level
+            assert result['scarcity_level'] == WaterLevelData.get_scarcity_level(nearest.water_level)
+
+    streamed = client.post('/api/nearest-wells?format=ndjson', json={'points': points})
+    assert streamed.mimetype == 'application/x-ndjson'
+    assert [json.loads(line) for line in streamed.get_data(as_text=True).splitlines()] == results
+
+def test_batch_rejects_bad_points(client):
+    assert client.post('/api/nearest-wells', json={'points': [[1, 'a']]}).status_code == 400
+    assert client.post('/api/nearest-wells', json={'points': [[1, float('nan')]]}).status_code == 400
+    assert client.post('/api/nearest-wells', json={'points': [[1, 2]] * 301}).status_code == 413
+    assert client.post('/api/nearest-wells', json={'points': []}).status_code == 400
+    assert client.post('/api/nearest-wells', data='nope').status_code == 400
\ No newline at end of file
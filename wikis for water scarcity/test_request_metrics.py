@@ -0,0 +1,57 @@
+import logging
+import pytest
+from database import db
+from models import User, Wiki
+
+@pytest.fixture
+def app_config():
+    return {'SLOW_REQUEST_SECONDS': 0, 'METRICS_TOKEN': 'scrape-token'}
+
+@pytest.fixture
+def app(app):
+    with app.app_context():
+        user = User(username='author', email='author@example.com')
+        db.session.add(Wiki(
+            title='Drip irrigation', content='<p>Save water</p>', author=user,
+            water_scarcity_level='high', category='agriculture'
+        ))
+        db.session.commit()
+        db.session.remove()
+    return app
+
+def sample(metrics, line_prefix):
+    return [float(line.rsplit(' ', 1)[1]) for line in metrics.splitlines() if line.startswith(line_prefix)]
+
+def test_metrics_are_recorded_per_endpoint(app):
+    client = app.test_client()
+    for path in ('/', '/wiki/1', '/wiki/1', '/missing'):
+        client.get(path)
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'})
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    metrics = response.get_data(as_text=True)
+
+    assert sample(metrics, 'wiki_requests_total{endpoint="main.view_wiki",method="GET",status="200"}') == [2]
+    assert sample(metrics, 'wiki_request_duration_seconds_count{endpoint="main.view_wiki",method="GET"}') == [2]
+    assert sample(metrics, 'wiki_request_duration_seconds_bucket{endpoint="main.home",method="GET",le="+Inf"}') == [1]
+    assert sample(metrics, 'wiki_request_sql_queries_sum{endpoint="main.home",method="GET"}')[0] >= 2
+    assert sample(metrics, 'wiki_request_sql_seconds_total{endpoint="main.home",method="GET"}')[0] > 0
+    assert sample(metrics, 'wiki_request_template_seconds_total{endpoint="main.home",method="GET"}')[0] > 0
+    assert sample(metrics, 'wiki_response_size_bytes_sum{endpoint="main.home",method="GET"}')[0] > 0
+    assert sample(metrics, 'wiki_requests_total{endpoint="unmatched",method="GET",status="404"}') == [1]
+    assert 'endpoint="metrics"' not in metrics
+
+def test_metrics_need_the_configured_token(app):
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    app.config['METRICS_TOKEN'] = None
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'}).status_code == 404
+
+def test_slow_requests_are_logged_with_their_sql(app, caplog):
+    with caplog.at_level(logging.WARNING, logger=app.logger.name):
+        app.test_client().get('/wiki/1')
+    messages = [record.getMessage() for record in caplog.records if record.getMessage().startswith('Slow request')]
+    assert len(messages) == 1
+    assert 'GET /wiki/1 -> 200' in messages[0]
+    assert 'FROM wiki' in messages[0]
\ No newline at end of file
@@ -0,0 +1,37 @@
+import math
+import os
+import pytest
+from import_excel import clear_water_level_data, import_excel_data
+from scarcity_raster import get_scarcity_raster, interpolate_grid
+from water_level_data import WaterLevelData, get_data_generation
+
+def test_interpolate_grid():
+    bounds = (10.0, 11.0, 70.0, 71.0)
+    grid = interpolate_grid([10.05, 10.05], [70.05, 70.95], [2.0, 12.0], bounds, 0.1, neighbours=2, max_distance_km=60)
+    assert grid.shape == (10, 10)
+    # Cells on a well take its reading, cells between wells a weighted mean
+    assert grid[0, 0] == pytest.approx(2.0)
+    assert grid[0, 9] == pytest.approx(12.0)
+    assert 2.0 < grid[0, 3] < 7.0 < grid[0, 6] < 12.0
+    # Nothing within reach of the far corner
+    assert math.isnan(grid[9, 4])
+
+def test_import_builds_raster(app, tmp_path):
+    csv_path = tmp_path / 'levels.csv'
+    csv_path.write_text('latitude,longitude,water_level\n13.0,80.0,2.0\n13.0,80.5,12.0\n13.5,80.25,7.0\n')
+    with app.app_context():
+        assert import_excel_data(str(csv_path))['success']
+        generation = get_data_generation()
+        raster = get_scarcity_raster(generation)
+        assert raster is not None
+        assert os.path.exists(tmp_path / 'water_data' / f'scarcity_raster.{generation}.snapshot')
+
+        assert raster.water_level(13.01, 80.01) == pytest.approx(2.0, abs=0.5)
+        between = WaterLevelData.water_level_at(13.0, 80.25)
+        assert 2.0 < between < 12.0
+        # Outside the grid the nearest well answers
+        assert WaterLevelData.water_level_at(10.0, 80.5) == 12.0
+
+        assert clear_water_level_data()
+        assert get_scarcity_raster(get_data_generation()) is None
+        assert WaterLevelData.water_level_at(13.0, 80.25) is None
\ No newline at end of file
@@ -0,0 +1,42 @@
+import numpy as np
+from spatial_index import SpatialIndex, EARTH_RADIUS_KM
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+def test_matches_brute_force_haversine():
+    rng = np.random.default_rng(42)
+    lats = rng.uniform(8, 35, 5000)
+    lons = rng.uniform(68, 97, 5000)
+    index = SpatialIndex(lats, lons)
+
+    query_lats = np.r_[rng.uniform(8, 35, 50), 40.7128, -33.8688]
+    query_lons = np.r_[rng.uniform(68, 97, 50), -74.0060, 151.2093]
+    distances, positions = index.query(query_lats, query_lons, k=3)
+
+    for i, (lat, lon) in enumerate(zip(query_lats, query_lons)):
+        expected = np.sort(haversine_km(lat, lon, lats, lons))[:3]
+        assert np.allclose(distances[i], expected, atol=1e-6)
+        assert np.allclose(haversine_km(lat, lon, lats[positions[i]], lons[positions[i]]), expected, atol=1e-6)
+
+def test_nearest_to_chennai():
+    # NYC, near NYC, LA and a well in Chennai
+    index = SpatialIndex([40.7128, 40.7142, 34.0522, 13.0072], [-74.0060, -74.0064, -118.2437, 80.1978])
+    distance, position = index.nearest(13.0220032, 80.2062336)
+    assert position == 3
+    assert distance < 2
+
+def test_small_and_empty_indexes():
+    assert SpatialIndex([], []).nearest(0, 0) is None
+
+    distances, positions = SpatialIndex([1.0], [2.0]).query([0.0], [0.0], k=3)
+    assert positions.tolist() == [[0, -1, -1]]
+    assert np.isinf(distances[0, 1:]).all()
+
+if __name__ == '__main__':
+    test_matches_brute_force_haversine()
+    test_nearest_to_chennai()
+    test_small_and_empty_indexes()
+    print('Spatial index tests passed')
\ No newline at end of file
@@ -0,0 +1,19 @@
+from sqlalchemy.pool import QueuePool
+from database import create_tuned_engine, storage_profile, SQLITE_PRAGMAS
+
+def test_sqlite_connections_get_the_profile(tmp_path):
+    engine = create_tuned_engine(f'sqlite:///{tmp_path / "profile.db"}')
+    assert isinstance(engine.pool, QueuePool)
+    with engine.connect() as connection:
+        pragma = lambda name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+        assert pragma('journal_mode') == 'wal'
+        assert pragma('synchronous') == 1  # NORMAL
+        assert pragma('busy_timeout') == SQLITE_PRAGMAS['busy_timeout']
+        assert pragma('cache_size') == SQLITE_PRAGMAS['cache_size']
+    engine.dispose()
+
+def test_pooling_per_backend():
+    assert storage_profile('sqlite://') == {}
+    server = storage_profile('postgresql://user@localhost/wiki')
+    assert server['pool_pre_ping'] and server['pool_size'] > 0
+    assert 'connect_args' not in server
\ No newline at end of file
@@ -0,0 +1,38 @@
+import numpy as np
+from import_excel import import_excel_data
+from spatial_index import SpatialIndex
+from water_level_data import WaterLevelData, get_data_generation
+from water_level_index import get_spatial_index, invalidate_spatial_index
+from water_level_snapshot import read_snapshot, write_snapshot
+
+def test_snapshot_round_trip(tmp_path):
+    rng = np.random.default_rng(7)
+    index = SpatialIndex(rng.uniform(8, 35, 1000), rng.uniform(68, 97, 1000))
+    path = str(tmp_path / 'index.snapshot')
+    write_snapshot(path, {**index.arrays(), 'empty': np.zeros(0)}, generation=3)
+
+    meta, arrays = read_snapshot(path)
+    assert meta == {'generation': 3}
+    assert arrays['empty'].shape == (0,)
+    assert not arrays['points'].flags.writeable
+
+    mapped = SpatialIndex.from_arrays(arrays)
+    query = (rng.uniform(8, 35, 20), rng.uniform(68, 97, 20))
+    for expected, actual in zip(index.query(*query, k=4), mapped.query(*query, k=4)):
+        assert np.array_equal(expected, actual)
+
+    assert read_snapshot(str(tmp_path / 'missing.snapshot')) is None
+
+def test_workers_map_imported_snapshot(app, tmp_path):
+    csv_path = tmp_path / 'levels.csv'
+    csv_path.write_text('latitude,longitude,water_level\n13.0072,80.1978,12.4\n40.7128,-74.006,7.5\n')
+    with app.app_context():
+        assert import_excel_data(str(csv_path))['success']
+        assert (tmp_path / 'water_data' / f'water_levels.{get_data_generation()}.snapshot').exists()
+
+        # A fresh worker maps the snapshot instead of reading the table
+        invalidate_spatial_index()
+        index = get_spatial_index()
+        assert not index.water_levels.flags.writeable
+        nearest = WaterLevelData.find_nearest_point(13.0220032, 80.2062336)
+        assert (nearest.latitude, nearest.longitude, nearest.water_level) == (13.0072, 80.1978, 12.4)
\ No newline at end of file
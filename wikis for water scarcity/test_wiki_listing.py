@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event
+import pytest
+from database import db
+from models import User, Wiki
+from pagination import decode_cursor, encode_cursor, paginate
+from views import WIKI_LISTING_KEYS, wiki_listing_query
+from water_level_data import WaterLevelData, bump_data_generation
+
+@pytest.fixture
+def app(app):
+    with app.app_context():
+        posted = datetime(2024, 1, 1)
+        for i in range(60):
+            user = User(username=f'user{i}', email=f'user{i}@example.com')
+            db.session.add(user)
+            db.session.add(Wiki(
+                title=f'Rainwater harvesting {i}',
+                content='<p>' + 'Collect and store rainwater. ' * 200 + '</p>',
+                author=user,
+                water_scarcity_level='high',
+                category='domestic',
+                date_posted=posted + timedelta(hours=i)
+            ))
+        db.session.commit()
+        db.session.remove()
+    return app
+
+@pytest.fixture
+def client(client):
+    # Leave the one-off first request and search index lookups out of the counts
+    client.get('/search?query=rainwater')
+    return client
+
+def run_counting_queries(client, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with client.application.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return response, statements
+
+@pytest.mark.parametrize('path', ['/', '/search?query=rainwater&category=domestic'])
+def test_listing_query_count_is_constant(client, path):
+    separator = '&' if '?' in path else '?'
+    counts = []
+    for per_page in (5, 50):
+        response, statements = run_counting_queries(client, f'{path}{separator}per_page={per_page}')
+        assert response.data.count(b'class="wiki-card"') == per_page
+        assert not any('wiki.content' in statement for statement in statements)
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+
+def test_cursor_with_wrong_key_count_is_rejected(client):
+    cursor = encode_cursor(WIKI_LISTING_KEYS, [datetime(2024, 1, 2).isoformat()], 'next')
+    response = client.get(f'/?cursor={cursor}')
+    assert response.status_code == 302 and response.location.endswith('/')
+
+def test_cursor_round_trip(client):
+    with client.application.app_context():
+        pages, cursor = [], None
+        while True:
+            page = paginate(wiki_listing_query(), WIKI_LISTING_KEYS, cursor=cursor, page_size=25)
+            pages.append([row.id for row in page.items])
+            if not page.next_cursor:
+                break
+            cursor = page.next_cursor
+        assert [len(ids) for ids in pages] == [25, 25, 10]
+        assert sum(pages, []) == list(range(60, 0, -1))
+
+        # Walking back from the last page returns the same pages
+        for expected in reversed(pages[:-1]):
+            page = paginate(wiki_listing_query(), WIKI_LISTING_KEYS, cursor=page.prev_cursor, page_size=25)
+            assert [row.id for row in page.items] == expected
+
+        values = [datetime(2024, 1, 2, 3, 4, 5), 7]
+        assert decode_cursor(WIKI_LISTING_KEYS, encode_cursor(WIKI_LISTING_KEYS, values, 'prev')) == (values, 'prev')
+
+def test_malformed_cursor_returns_to_the_first_page(client):
+    response = client.get('/?cursor=not-a-cursor')
+    assert response.status_code == 302 and response.location.endswith('/')
+    # Searches keep their filters
+    response = client.get('/search?query=rainwater&category=domestic&cursor=not-a-cursor')
+    assert response.status_code == 302
+    assert response.location.endswith('/search?query=rainwater&category=domestic')
+    assert client.get(response.location).status_code == 200
+
+def test_cached_listing_links_keep_each_searchers_coordinates(client):
+    with client.application.app_context():
+        db.session.add(WaterLevelData(latitude=13.0, longitude=80.2, water_level=12.4))
+        db.session.commit()
+        bump_data_generation()
+
+    # Both searches share one cached listing; each page links with its own coordinates
+    for latitude, other in (('13.01', '13.02'), ('13.02', '13.01')):
+        response = client.get(f'/search?use_location=true&latitude={latitude}&longitude=80.2&per_page=5')
+        assert response.data.count(b'class="wiki-card"') == 5
+        page = response.get_data(as_text=True)
+        assert f'latitude={latitude}' in page
+        assert f'latitude={other}' not in page
\ No newline at end of file
@@ -0,0 +1,66 @@
+import pytest
+from database import db
+from models import User, Wiki
+from views import WIKI_LISTING_KEYS
+import wiki_search
+from wiki_search import apply_text_search, is_enabled
+
+WIKIS = [
+    ('Drip irrigation', '<p>Drip lines save <b>water</b> on farms</p>'),
+    ('Rainwater harvesting', '<p>Collect rain from rooftops</p>'),
+    ('Greywater reuse', '<p>Reuse sink water for gardens</p>'),
+    ('Borewell recharge', '<p>Recharge pits refill aquifers</p>'),
+    ('WATER audits', '<p>Meter every tap</p>')
+]
+
+@pytest.fixture
+def app(app):
+    with app.app_context():
+        user = User(username='author', email='author@example.com')
+        db.session.add(user)
+        db.session.add_all([
+            Wiki(title=title, content=content, author=user, water_scarcity_level='high', category='domestic')
+            for title, content in WIKIS
+        ])
+        db.session.commit()
+    return app
+
+def matching_titles(text):
+    query, keys = apply_text_search(db.session.query(Wiki.id, Wiki.title), Wiki, text, WIKI_LISTING_KEYS)
+    return sorted(row.title for row in query.all())
+
+# The index matches word prefixes and LIKE matches substrings, so these are
+# words that do not also occur inside longer words (as "water" in "rainwater")
+@pytest.mark.parametrize('text', ['Drip', 'recharge', 'rain', 'reuse', 'aquifers', 'meter', 'WATER audits'])
+def test_full_text_results_match_like_fallback(app, text, monkeypatch):
+    with app.app_context():
+        assert is_enabled()
+        indexed = matching_titles(text)
+        monkeypatch.setattr(wiki_search, 'is_enabled', lambda connection=None: False)
+        assert matching_titles(text) == indexed
+        assert indexed
+
+def indexed_ids():
+    return sorted(row[0] for row in db.session.execute(f'SELECT rowid FROM {wiki_search.FTS_TABLE}'))
+
+def test_index_created_by_another_process_is_kept_in_sync(app):
+    with app.app_context():
+        db.session.execute(f'DROP TABLE {wiki_search.FTS_TABLE}')
+        db.session.commit()
+        wiki_search._enabled_urls.clear()
+        assert not is_enabled()
+        db.session.rollback()
+
+        # As flask init-db does from another process, leaving this one's cache alone
+        with db.engine.begin() as connection:
+            connection.execute(db.text(f'CREATE VIRTUAL TABLE {wiki_search.FTS_TABLE} USING fts5(title, content)'))
+            wiki_search._rebuild(connection)
+        user = User.query.first()
+        db.session.add(Wiki(title='Check dams', content='<p>Slow the runoff</p>', author=user,
+                            water_scarcity_level='high', category='business'))
+        db.session.delete(Wiki.query.filter_by(title='Borewell recharge').one())
+        db.session.commit()
+
+        assert indexed_ids() == sorted(wiki.id for wiki in Wiki.query.all())
+        assert is_enabled()
+        assert matching_titles('dams') == ['Check dams']
\ No newline at end of file
@@ -0,0 +1,623 @@
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify, abort, get_template_attribute, make_response
+from sqlalchemy.exc import SQLAlchemyError
+from flask_login import login_user, login_required, logout_user, current_user
+import os
+from itertools import islice
+from database import db
+from extensions import csrf, fragment_cache, login_manager, media_store
+from models import User, Wiki, WikiMedia, store_media, queue_derivatives, release_media_files
+from water_level_data import WaterLevelData, get_data_generation
+from import_jobs import import_jobs
+from wiki_search import apply_text_search
+from pagination import paginate, page_size_arg
+from conditional import make_etag, not_modified, add_validators, public_not_modified, add_public_validators
+from media_store import InvalidUpload, is_stored_name
+from media_serving import send_media
+from request_metrics import timed_render
+
+main = Blueprint('main', __name__)
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'webm'}
+
+@main.app_errorhandler(413)
+def too_large(e):
+    return "File is too large", 413
+
+@main.app_errorhandler(404)
+def not_found(e):
+    return render_template('404.html'), 404
+
+@main.app_errorhandler(500)
+def server_error(e):
+    return render_template('500.html'), 500
+
+def allowed_file(filename):
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS and \
+           os.path.splitext(filename)[1].lower() in current_app.config['UPLOAD_EXTENSIONS']
+
+@main.before_app_first_request
+def resume_derivatives():
+    # Pick up images whose derivatives were interrupted, e.g. by a restart
+    queue_derivatives(WikiMedia.query.filter_by(derivatives_status='pending').all())
+
+def wiki_listing_query():
+    """Columns shown on wiki cards, with the author joined in.
+
+    Rows are plain tuples, so rendering a page never lazy-loads authors and
+    the ``content`` column is never read.
+    """
+    thumbnail = db.session.query(WikiMedia.thumbnail) \
+        .filter(WikiMedia.wiki_id == Wiki.id, WikiMedia.thumbnail.isnot(None)) \
+        .order_by(WikiMedia.id).limit(1).correlate(Wiki).scalar_subquery()
+    return db.session.query(
+        Wiki.id,
+        Wiki.title,
+        Wiki.date_posted,
+        User.username.label('author_name'),
+        Wiki.category,
+        Wiki.water_scarcity_level,
+        thumbnail.label('thumbnail')
+    ).join(User, Wiki.user_id == User.id)
+
+# Newest first; id breaks ties so every row has a unique position
+WIKI_LISTING_KEYS = [('date_posted', Wiki.date_posted, True), ('id', Wiki.id, True)]
+
+def listing_page(query, keys):
+    """Paginate a wiki listing using the ``cursor`` and ``per_page`` request args."""
+    return paginate(
+        query, keys,
+        cursor=request.args.get('cursor'),
+        page_size=page_size_arg(request.args.get('per_page'), current_app.config['WIKIS_PER_PAGE'])
+    )
+
+def page_url(cursor):
+    """Link to the listing page at ``cursor``, keeping the other request args."""
+    return url_for(request.endpoint, **{**request.args.to_dict(), 'cursor': cursor}) if cursor else None
+
+def invalid_cursor():
+    """Send a request with a malformed or stale ``cursor`` to the first page of its listing."""
+    flash('Invalid page link')
+    args = request.args.to_dict()
+    args.pop('cursor', None)
+    return redirect(url_for(request.endpoint, **args))
+
+def cache_variant():
+    return 'authenticated' if current_user.is_authenticated else 'anonymous'
+
+def listing_validators(*parts):
+    """ETag, newest change and wiki count for a listing page, from one aggregate query.
+
+    The wiki count makes deletions change the ETag; ``parts`` adds anything
+    else the listing depends on. Listings send no Last-Modified: deleting a
+    wiki leaves the newest change as it was, so a client revalidating with
+    If-Modified-Since alone would keep a page that lost a row.
+    """
+    last_modified, count = db.session.query(db.func.max(Wiki.last_modified), db.func.count(Wiki.id)).one()
+    etag = make_etag(
+        request.endpoint, request.query_string.decode(), current_user.get_id(),
+        last_modified, count, *parts
+    )
+    return etag, last_modified, count
+
+def render_wiki_list(query, keys, filters, last_modified, count):
+    """Rendered listing page for the current request, served from the fragment cache when possible.
+
+    ``filters`` must hold every input that changes which wikis are listed;
+    ``last_modified`` and ``count`` come from ``listing_validators``.
+    Only the list and its neighbouring cursors are cached; the pagination
+    links carry the request's own args (e.g. a searcher's coordinates), so
+    they are rendered per request.
+    """
+    def render():
+        page = listing_page(query, keys)
+        with timed_render():
+            return {
+                'list': str(get_template_attribute('_wiki_fragments.html', 'wiki_list')(page.items)),
+                'prev_cursor': page.prev_cursor,
+                'next_cursor': page.next_cursor
+            }
+
+    params = {name: request.args.get(name) for name in ('cursor', 'per_page') if request.args.get(name)}
+    key = fragment_cache.listing_key(request.endpoint, cache_variant(), {**params, **filters}, last_modified, count)
+    fragment = fragment_cache.get_or_render(key, render)
+    links = get_template_attribute('_wiki_fragments.html', 'pagination')(
+        page_url(fragment['prev_cursor']), page_url(fragment['next_cursor'])
+    )
+    return fragment['list'] + str(links)
+
+@login_manager.user_loader
+def load_user(user_id):
+    return User.query.get(int(user_id))
+
+@main.route('/')
+def home():
+    etag, last_modified, count = listing_validators()
+    response = not_modified(etag)
+    if response:
+        return response
+    try:
+        wiki_list = render_wiki_list(wiki_listing_query(), WIKI_LISTING_KEYS, {}, last_modified, count)
+    except ValueError:
+        return invalid_cursor()
+    return add_validators(make_response(render_template('home.html', wiki_list=wiki_list)), etag)
+
+@main.route('/wiki/<int:wiki_id>')
+def view_wiki(wiki_id):
+    validators = db.session.query(Wiki.version, Wiki.last_modified).filter(Wiki.id == wiki_id).first_or_404()
+    # The edit link depends on who is viewing
+    etag = make_etag('wiki', wiki_id, validators.version, current_user.get_id())
+    response = not_modified(etag, validators.last_modified)
+    if response:
+        return response
+
+    def render():
+        wiki = Wiki.query.get_or_404(wiki_id)
+        with timed_render():
+            return {
+                'header': str(get_template_attribute('_wiki_fragments.html', 'wiki_header')(wiki)),
+                'body': str(get_template_attribute('_wiki_fragments.html', 'wiki_body')(wiki)),
+                'author_id': wiki.user_id
+            }
+
+    key = fragment_cache.wiki_key(wiki_id, validators.version, cache_variant())
+    fragment = fragment_cache.get_or_render(key, render)
+    response = make_response(render_template('view_wiki.html', fragment=fragment, wiki_id=wiki_id))
+    return add_validators(response, etag, validators.last_modified)
+
+@main.route('/create_wiki', methods=['GET', 'POST'])
+@login_required
+def create_wiki():
+    if request.method == 'POST':
+        try:
+            if not request.form.get('title') or not request.form.get('content') or not request.form.get('water_scarcity_level') or not request.form.get('category'):
+                flash('Title, content, water scarcity level, and category are required!')
+                return redirect(url_for('main.create_wiki'))
+
+            water_scarcity_level = request.form['water_scarcity_level']
+            category = request.form['category']
+
+            title = request.form['title']
+            content = request.form['content']
+            wiki = Wiki(title=title, content=content, author=current_user, water_scarcity_level=water_scarcity_level, category=category)
+            
+            # Handle media file uploads
+            media_files = request.files.getlist('media')
+            for file in media_files:
+                if not file or file.filename == '':
+                    continue
+                    
+                if not allowed_file(file.filename):
+                    flash(f'File type not allowed for {file.filename}. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}')
+                    continue
+                    
+                try:
+                    db.session.add(store_media(file, wiki))
+                except InvalidUpload as e:
+                    current_app.logger.warning(f'Invalid upload {file.filename}: {str(e)}')
+                    flash(f'Invalid file content or size for {file.filename}')
+                    continue
+                except IOError as e:
+                    current_app.logger.error(f'File save error for {file.filename}: {str(e)}')
+                    flash(f'Error saving file {file.filename}. Please try again.')
+                    continue
+                except Exception as e:
+                    current_app.logger.error(f'Unexpected error during file upload for {file.filename}: {str(e)}')
+                    flash(f'Unexpected error uploading {file.filename}')
+                    continue
+
+            db.session.add(wiki)
+            db.session.commit()
+            queue_derivatives(wiki.media_files)
+            flash('Your wiki has been created!')
+            return redirect(url_for('main.home'))
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Create wiki error: {str(e)}')
+            flash('An error occurred while creating the wiki')
+            return redirect(url_for('main.create_wiki'))
+
+    return render_template('create_wiki.html')
+
+@main.route('/edit_wiki/<int:wiki_id>', methods=['GET', 'POST'])
+@login_required
+def edit_wiki(wiki_id):
+    wiki = Wiki.query.get_or_404(wiki_id)
+    if not wiki:
+        abort(404)
+    if wiki.author != current_user:
+        flash('You do not have permission to edit this wiki')
+        return redirect(url_for('main.home'))
+    if request.method == 'POST':
+        try:
+            wiki.title = request.form['title']
+            wiki.content = request.form['content']
+
+            # Handle media file deletions; files go once nothing references them
+            released = []
+            media_to_delete = request.form.getlist('delete_media')
+            for media_id in media_to_delete:
+                media = WikiMedia.query.get(int(media_id))
+                if media and media.wiki_id == wiki.id:
+                    released.append((media.filename, media.content_hash))
+                    db.session.delete(media)
+
+            # Handle media file uploads
+            media_files = request.files.getlist('media')
+            for file in media_files:
+                if file and allowed_file(file.filename):
+                    try:
+                        db.session.add(store_media(file, wiki))
+                    except InvalidUpload as e:
+                        flash(f'Invalid file content or size for {file.filename}')
+                        continue
+                    except Exception as e:
+                        flash(f'Error uploading file {file.filename}')
+                        continue
+
+            wiki.touch()
+            db.session.commit()
+            release_media_files(released)
+            queue_derivatives(wiki.media_files)
+            flash('Your wiki has been updated!')
+            return redirect(url_for('main.home'))
+        except Exception as e:
+            db.session.rollback()
+            flash('An error occurred while updating the wiki')
+            return redirect(url_for('main.edit_wiki', wiki_id=wiki_id))
+    return render_template('create_wiki.html', wiki=wiki)
+
+@main.route('/search')
+def search():
+    try:
+        query = request.args.get('query', '')
+        # The home form always sends use_location, as 'true' or 'false'
+        use_location = request.args.get('use_location') == 'true'
+        category = request.args.get('category', '')
+
+        current_app.logger.info(f'Search request - Query: {query}, Category: {category}, Use Location: {use_location}')
+
+        # Location searches also depend on the loaded water level data, and on
+        # whether its scarcity raster is built yet
+        data_generation = raster_built = None
+        if use_location:
+            from scarcity_raster import get_scarcity_raster
+            data_generation = get_data_generation()
+            raster_built = get_scarcity_raster(data_generation) is not None
+        etag, last_modified, count = listing_validators(data_generation, raster_built)
+        response = not_modified(etag)
+        if response:
+            return response
+
+        # Start with base query
+        wikis = wiki_listing_query()
+        listing_keys = WIKI_LISTING_KEYS
+        filters = {'query': query.strip(), 'category': category.strip().lower()}
+
+        # Apply category filter if specified
+        if category and category.strip():
+            current_app.logger.info(f'Applying category filter: {category}')
+            try:
+                # Use exact match for category since it's a controlled field
+                wikis = wikis.filter(Wiki.category == category.strip().lower())
+                current_app.logger.info('Category filter applied successfully')
+            except SQLAlchemyError as e:
+                current_app.logger.error(f'Error applying category filter: {str(e)}')
+                flash('An error occurred while filtering by category')
+                return redirect(url_for('main.home'))
+
+        # Handle location-based filtering
+        if use_location:
+            lat = request.args.get('latitude', type=float)
+            lon = request.args.get('longitude', type=float)
+            
+            if lat is not None and lon is not None:
+                try:
+                    if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+                        flash('Invalid coordinates detected')
+                        return redirect(url_for('main.home'))
+
+                    water_level = WaterLevelData.water_level_at(lat, lon, data_generation)
+                    if water_level is None:
+                        flash('No water level data found for your location')
+                        return redirect(url_for('main.home'))
+
+                    scarcity_level = WaterLevelData.get_scarcity_level(water_level)
+                    wikis = wikis.filter(Wiki.water_scarcity_level == scarcity_level)
+                    filters['scarcity_level'] = scarcity_level
+                except (ValueError, SQLAlchemyError) as e:
+                    current_app.logger.error(f'Error processing location data: {str(e)}')
+                    flash('An error occurred while processing location data')
+                    return redirect(url_for('main.home'))
+
+        # Apply search query filter if specified
+        if query and query.strip():
+            try:
+                # Full-text index match, ranked by relevance
+                wikis, listing_keys = apply_text_search(wikis, Wiki, query.strip(), WIKI_LISTING_KEYS)
+            except SQLAlchemyError as e:
+                current_app.logger.error(f'Error applying search query filter: {str(e)}')
+                flash('An error occurred while processing your search query')
+                return redirect(url_for('main.home'))
+
+        try:
+            # Execute query and render one page of results
+            try:
+                wiki_list = render_wiki_list(wikis, listing_keys, filters, last_modified, count)
+            except ValueError:
+                return invalid_cursor()
+
+            # Prepare template parameters
+            template_params = {
+                'wiki_list': wiki_list,
+                'search_query': query,
+                'category': category
+            }
+
+            # Add water level info if location-based search was used
+            if use_location and 'water_level' in locals():
+                template_params['water_level'] = water_level
+
+            response = make_response(render_template('home.html', **template_params))
+            return add_validators(response, etag)
+
+        except SQLAlchemyError as e:
+            current_app.logger.error(f'Error executing search query: {str(e)}')
+            flash('An error occurred while processing your search')
+            return redirect(url_for('main.home'))
+
+    except Exception as e:
+        current_app.logger.error(f'Unexpected error in search route: {str(e)}')
+        flash('An unexpected error occurred')
+        return redirect(url_for('main.home'))
+        
+    except Exception as e:
+        current_app.logger.error(f'Search error: {str(e)}')
+        flash('An error occurred while processing your search')
+        return redirect(url_for('main.home'))
+
+@main.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        if not request.form.get('username') or not request.form.get('email') or not request.form.get('password'):
+            flash('All fields are required!')
+            return redirect(url_for('main.register'))
+        username = request.form['username']
+        email = request.form['email']
+        password = request.form['password']
+        
+        if User.query.filter_by(username=username).first():
+            flash('Username already exists')
+            return redirect(url_for('main.register'))
+            
+        if User.query.filter_by(email=email).first():
+            flash('Email already registered')
+            return redirect(url_for('main.register'))
+            
+        user = User(username=username, email=email)
+        user.set_password(password)
+        db.session.add(user)
+        try:
+            db.session.commit()
+            flash('Registration successful!')
+            return redirect(url_for('main.login'))
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            flash('An error occurred during registration')
+            return redirect(url_for('main.register'))
+    return render_template('register.html')
+
+@main.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        if not request.form.get('username') or not request.form.get('password'):
+            flash('Username and password are required!')
+            return redirect(url_for('main.login'))
+        username = request.form['username']
+        password = request.form['password']
+        user = User.query.filter_by(username=username).first()
+        
+        if user and user.check_password(password):
+            login_user(user)
+            return redirect(url_for('main.home'))
+        flash('Invalid username or password')
+    return render_template('login.html')
+
+@main.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    return redirect(url_for('main.home'))
+
+@main.route('/import-data', methods=['POST'])
+@login_required
+def import_data():
+    try:
+        excel_file_path = os.getenv('EXCEL_FILE_PATH')
+        if not excel_file_path:
+            return jsonify({'error': 'Excel file path not configured'}), 400
+
+        if not os.path.exists(excel_file_path):
+            return jsonify({'error': 'Excel file not found'}), 404
+
+        # Import runs in the background; it replaces the current data only once fully loaded.
+        # mode=incremental writes only the rows that changed since the last import.
+        incremental = request.values.get('mode') == 'incremental'
+        job = import_jobs.submit(current_app._get_current_object(), excel_file_path, incremental=incremental)
+        current_app.logger.info(f'Queued import job {job.id} for {excel_file_path}')
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': url_for('main.import_status', job_id=job.id)
+        }), 202
+
+    except Exception as e:
+        current_app.logger.error(f'Data import error: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+@main.route('/import-data/<job_id>')
+@login_required
+def import_status(job_id):
+    status = import_jobs.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Import job not found'}), 404
+    return jsonify(status)
+
+@main.route('/import-data/rollback', methods=['POST'])
+@login_required
+def rollback_import():
+    # Only the import path loads pandas and the Excel readers
+    from import_excel import rollback_water_level_data
+
+    if not rollback_water_level_data():
+        return jsonify({'success': False, 'error': 'No previous water level data to restore'}), 409
+    current_app.logger.info('Restored previous water level data')
+    return jsonify({'success': True, 'message': 'Restored previous water level data'})
+
+# Lines per chunk of a streamed NDJSON response
+NDJSON_CHUNK_LINES = 1000
+
+@main.route('/api/nearest-wells', methods=['POST'])
+@csrf.exempt
+def nearest_wells():
+    """Nearest well, water level and scarcity level for a batch of coordinates.
+
+    Takes ``{"points": [[latitude, longitude], ...]}`` and answers with one
+    result per point, in order, as JSON or, with ``?format=ndjson`` or an
+    ``application/x-ndjson`` Accept header, as a stream of NDJSON lines.
+    Batches above ``NEAREST_BATCH_MAX_POINTS`` are refused with 413.
+    """
+    from water_level_index import nearest_well_lines, parse_points
+
+    data = request.get_json(silent=True)
+    points = data.get('points') if isinstance(data, dict) else None
+    if not isinstance(points, list) or not points:
+        return jsonify({'error': 'Expected {"points": [[latitude, longitude], ...]}'}), 400
+    max_points = current_app.config['NEAREST_BATCH_MAX_POINTS']
+    if len(points) > max_points:
+        return jsonify({'error': f'At most {max_points} points per request'}), 413
+    try:
+        lats, lons = parse_points(points)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        lines = nearest_well_lines(lats, lons, WaterLevelData.find_nearest_wells(lats, lons))
+    except SQLAlchemyError as e:
+        current_app.logger.error(f'Error looking up nearest wells: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+    # Lines are preformatted; encoding 100k dicts with jsonify takes seconds
+    ndjson = 'application/x-ndjson'
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best_match(['application/json', ndjson]) == ndjson:
+        def stream():
+            while True:
+                chunk = list(islice(lines, NDJSON_CHUNK_LINES))
+                if not chunk:
+                    break
+                yield '\n'.join(chunk) + '\n'
+        return current_app.response_class(stream(), mimetype=ndjson)
+    return current_app.response_class('{"results":[' + ','.join(lines) + ']}', mimetype='application/json')
+
+@main.route('/tiles/<int:z>/<int:x>/<int:y>')
+def map_tile(z, x, y):
+    """Clustered water level aggregates of one XYZ map tile.
+
+    Answers GeoJSON, or with ``?format=bin`` the packed records described in
+    ``water_level_tiles``. Tiles are cached per data generation, so panning
+    a map costs cache hits rather than scans of the data. They are the same
+    for every user, so browsers and shared caches may keep them for
+    ``TILE_MAX_AGE`` seconds and then revalidate by the generation ETag.
+    """
+    from water_level_index import get_spatial_index
+    from water_level_tiles import MAX_ZOOM, clusters_binary, clusters_geojson, tile_clusters
+
+    if not (0 <= z <= MAX_ZOOM and x < 1 << z and y < 1 << z):
+        abort(404)
+    binary = request.args.get('format') == 'bin'
+    data_generation = get_data_generation()
+    etag = make_etag('tile', data_generation, z, x, y, binary)
+    max_age = current_app.config['TILE_MAX_AGE']
+    response = public_not_modified(etag, max_age)
+    if response:
+        return response
+
+    clusters = fragment_cache.get_or_render(
+        fragment_cache.tile_key(data_generation, z, x, y), lambda: tile_clusters(get_spatial_index(), z, x, y)
+    )
+    if binary:
+        response = current_app.response_class(clusters_binary(clusters), mimetype='application/octet-stream')
+    else:
+        response = jsonify(clusters_geojson(clusters))
+        response.mimetype = 'application/geo+json'
+    return add_public_validators(response, etag, max_age)
+
+@main.route('/cache-stats')
+@login_required
+def cache_stats():
+    return jsonify(fragment_cache.stats())
+
+@main.route('/media/<path:filename>')
+def media(filename):
+    return send_media(
+        current_app.config['UPLOAD_FOLDER'], filename,
+        accel_prefix=current_app.config['MEDIA_ACCEL_REDIRECT_PREFIX']
+    )
+
+@main.route('/upload_media', methods=['POST'])
+@login_required
+def upload_media():
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file part'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No selected file'}), 400
+
+        if file and allowed_file(file.filename):
+            try:
+                # Editor uploads are referenced from wiki content only; collect_unreferenced_media
+                # deletes them once no wiki links to them
+                filename, _, _ = media_store.save(file, file.filename.rsplit('.', 1)[1].lower())
+                return jsonify({
+                    'location': url_for('main.media', filename=filename)
+                })
+            except InvalidUpload as e:
+                current_app.logger.warning(f'Invalid upload {file.filename}: {str(e)}')
+                return jsonify({'error': 'Invalid file content'}), 400
+            except Exception as e:
+                current_app.logger.error(f'File upload error: {str(e)}')
+                return jsonify({'error': 'Failed to save file'}), 500
+        
+        return jsonify({'error': 'File type not allowed'}), 400
+    except Exception as e:
+        current_app.logger.error(f'Upload media error: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+# Enhanced error handling for database operations
+@main.app_errorhandler(SQLAlchemyError)
+def handle_db_error(error):
+    db.session.rollback()
+    current_app.logger.error(f'Database error: {str(error)}')
+    return 'Database error occurred', 500
+
+# Content-addressed uploads never change, so browsers and CDNs may keep them
+# indefinitely; this covers editor images linked through /static before /media
+@main.after_app_request
+def cache_stored_media(response):
+    if request.endpoint == 'static' and response.status_code in (200, 304):
+        filename = request.view_args.get('filename', '')
+        if filename.startswith('uploads/') and is_stored_name(filename[len('uploads/'):]):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = 365 * 24 * 3600
+            response.cache_control.immutable = True
+    return response
+
+# Add request logging
+@main.before_app_request
+def log_request_info():
+    if not request.path.startswith('/static'):
+        current_app.logger.info(f'Request: {request.method} {request.path}')
\ No newline at end of file
@@ -1,5 +1,9 @@
+from flask import current_app
 from database import db
-from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+
+# Classes returned by WaterLevelData.get_scarcity_level, least scarce first
+SCARCITY_LEVELS = ('low', 'moderate', 'high')
 
 class WaterLevelData(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -18,29 +22,97 @@ class WaterLevelData(db.Model):
 
     @staticmethod
     def find_nearest_point(lat, lon):
-        # Using Haversine formula to find nearest point
-        earth_radius = 6371  # Earth's radius in kilometers
-        
         # Ensure coordinates are within valid ranges
         if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
             return None
-            
+
+        nearest = WaterLevelData.find_nearest_points(lat, lon, k=1)
+        return nearest[0] if nearest else None
+
+    @staticmethod
+    def find_nearest_wells(lats, lons):
+        """Nearest well, distance, water level and scarcity level for arrays of coordinates.
+
+        Vectorized counterpart of ``find_nearest_point``; see
+        ``WaterLevelIndex.nearest_wells`` for the returned arrays.
+        """
+        from water_level_index import get_spatial_index
+
+        return get_spatial_index().nearest_wells(lats, lons)
+
+    @staticmethod
+    def water_level_at(lat, lon, generation=None):
+        """Water level at a coordinate, interpolated from the scarcity raster once it is built.
+
+        Falls back to the nearest well's reading; None when there is no data.
+        """
+        # Imported here so numpy loads with the first lookup, not with the app
+        from scarcity_raster import get_scarcity_raster
+
+        if generation is None:
+            generation = get_data_generation()
+        raster = get_scarcity_raster(generation)
+        if raster is not None:
+            level = raster.water_level(lat, lon)
+            if level is not None:
+                return level
+        nearest = WaterLevelData.find_nearest_point(lat, lon)
+        return nearest.water_level if nearest else None
+
+    @staticmethod
+    def find_nearest_points(lat, lon, k=1):
+        """Return up to ``k`` points closest to the coordinate, nearest first.
+
+        Points come from the in-process spatial index and are detached
+        ``WaterLevelData`` instances, so reading them costs no queries.
+        """
+        # Imported here so numpy loads with the first lookup, not with the app
+        from water_level_index import get_spatial_index
+
         try:
-            # Calculate distance using simplified Haversine formula
-            lat1_rad = db.func.radians(lat)
-            lat2_rad = db.func.radians(WaterLevelData.latitude)
-            delta_lat = db.func.radians(WaterLevelData.latitude - lat)
-            delta_lon = db.func.radians(WaterLevelData.longitude - lon)
-            
-            # Calculate using Haversine formula components
-            a = db.func.pow(db.func.sin(delta_lat / 2), 2) + \
-                db.func.cos(lat1_rad) * db.func.cos(lat2_rad) * \
-                db.func.pow(db.func.sin(delta_lon / 2), 2)
-            
-            c = 2 * db.func.asin(db.func.sqrt(a))
-            distance = earth_radius * c
-            
-            return WaterLevelData.query.order_by(distance).first()
-        except Exception as e:
-            print(f'Error finding nearest point: {str(e)}')
-            return None
\ No newline at end of file
+            index = get_spatial_index()
+        except SQLAlchemyError as e:
+            current_app.logger.error(f'Error loading water level index: {str(e)}')
+            raise
+        distances, positions = index.query(lat, lon, k=k)
+        return [index.point(position) for position in positions[0] if position >= 0]
+
+class WaterLevelMeta(db.Model):
+    """Key/value bookkeeping for the water level dataset (e.g. its generation)."""
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(255), nullable=False)
+
+def get_meta_value(key, default=None):
+    meta = WaterLevelMeta.query.get(key)
+    return meta.value if meta else default
+
+def set_meta_value(key, value):
+    """Stage a metadata value in the current transaction; the caller commits."""
+    meta = WaterLevelMeta.query.get(key)
+    if meta is None:
+        meta = WaterLevelMeta(key=key, value=value)
+        db.session.add(meta)
+    meta.value = value
+    db.session.flush()
+
+def get_data_generation():
+    """Return the generation number of the water level dataset."""
+    meta = WaterLevelMeta.query.get('generation')
+    return int(meta.value) if meta else 0
+
+def bump_data_generation(commit=True):
+    """Mark the water level dataset as replaced so every process rebuilds its index.
+
+    Call after committing any change to ``water_level_data``, or with
+    ``commit=False`` to make the bump part of the caller's transaction.
+    """
+    meta = WaterLevelMeta.query.get('generation')
+    if meta is None:
+        meta = WaterLevelMeta(key='generation', value='0')
+        db.session.add(meta)
+    meta.value = str(int(meta.value) + 1)
+    if commit:
+        db.session.commit()
+    else:
+        db.session.flush()
+    return int(meta.value)
\ No newline at end of file
@@ -0,0 +1,223 @@
+from flask import current_app
+from database import db
+from extensions import fragment_cache
+from spatial_index import SpatialIndex
+from water_level_data import SCARCITY_LEVELS, WaterLevelData, get_data_generation
+from water_level_snapshot import read_snapshot, remove_stale_generations, write_snapshot
+from water_level_tiles import occupied_tiles, tile_clusters, tile_order
+import hashlib
+import numpy as np
+import os
+import threading
+
+# Coordinates per query call in batch lookups
+QUERY_BATCH = 16384
+# Layout of the arrays in a snapshot; older snapshots are ignored
+SNAPSHOT_LAYOUT = 2
+
+def scarcity_codes(water_levels):
+    """Index into ``SCARCITY_LEVELS`` of ``WaterLevelData.get_scarcity_level`` for an array of water levels."""
+    levels = np.asarray(water_levels, dtype=np.float64)
+    return np.where((levels >= 0) & (levels <= 5), 0, np.where((levels > 5) & (levels <= 10), 1, 2)).astype(np.uint8)
+
+def scarcity_levels(water_levels):
+    """``WaterLevelData.get_scarcity_level`` for an array of water levels."""
+    return np.array(SCARCITY_LEVELS)[scarcity_codes(water_levels)]
+
+def parse_points(points):
+    """Latitude and longitude arrays from a list of ``[latitude, longitude]`` pairs.
+
+    Raises ``ValueError`` unless every pair holds two finite numbers.
+    """
+    try:
+        coordinates = np.asarray(points, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError('Points must be [latitude, longitude] number pairs')
+    if coordinates.ndim != 2 or coordinates.shape[1] != 2 or not np.isfinite(coordinates).all():
+        raise ValueError('Points must be [latitude, longitude] number pairs')
+    return coordinates[:, 0], coordinates[:, 1]
+
+# Results are formatted straight to JSON text: coordinates to 6 decimals
+# (about 0.1m) and distances to the metre, readings exactly as stored
+FOUND_LINE = (
+    '{"latitude":%.6f,"longitude":%.6f,"well_id":%d,"well_latitude":%.6f,"well_longitude":%.6f,'
+    '"distance_km":%.3f,"water_level":%r,"scarcity_level":"%s"}'
+)
+MISSING_LINE = (
+    '{"latitude":%.6f,"longitude":%.6f,"well_id":null,"well_latitude":null,"well_longitude":null,'
+    '"distance_km":null,"water_level":null,"scarcity_level":null}'
+)
+
+def nearest_well_lines(lats, lons, wells):
+    """One compact JSON object per coordinate of a ``nearest_wells`` result."""
+    columns = [wells[key].tolist() for key in ('found', 'id', 'latitude', 'longitude', 'distance_km', 'water_level', 'scarcity_level')]
+    for lat, lon, found, *well in zip(lats.tolist(), lons.tolist(), *columns):
+        yield FOUND_LINE % (lat, lon, *well) if found else MISSING_LINE % (lat, lon)
+
+class WaterLevelIndex(SpatialIndex):
+    """Spatial index over one generation of ``water_level_data``."""
+
+    def __init__(self, generation, ids, latitudes, longitudes, water_levels):
+        super().__init__(latitudes, longitudes)
+        self.generation = generation
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.water_levels = np.asarray(water_levels, dtype=np.float64)
+        self.scarcity_codes = scarcity_codes(self.water_levels)
+        # Points in Morton order, for map tiles
+        self.tile_codes, self.tile_order = tile_order(self.latitudes, self.longitudes)
+
+    @classmethod
+    def load(cls, generation):
+        rows = db.session.query(
+            WaterLevelData.id,
+            WaterLevelData.latitude,
+            WaterLevelData.longitude,
+            WaterLevelData.water_level
+        ).all()
+        columns = np.array(rows, dtype=np.float64).reshape(-1, 4)
+        return cls(generation, columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3])
+
+    @classmethod
+    def open_snapshot(cls, generation):
+        """Map the snapshot of ``generation`` written by ``save_snapshot``, or None if there is none."""
+        snapshot = read_snapshot(snapshot_path(generation))
+        if snapshot is None:
+            return None
+        meta, arrays = snapshot
+        # Generations are numbered per database, so check the snapshot is of this one
+        if meta.get('database') != database_id() or meta.get('layout') != SNAPSHOT_LAYOUT:
+            return None
+        index = cls.from_arrays(arrays)
+        index.generation = generation
+        return index
+
+    def save_snapshot(self):
+        path = snapshot_path(self.generation)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_snapshot(path, self.arrays(), generation=self.generation, database=database_id(), layout=SNAPSHOT_LAYOUT)
+
+    def arrays(self):
+        return {
+            **super().arrays(), 'ids': self.ids, 'water_levels': self.water_levels,
+            'scarcity_codes': self.scarcity_codes, 'tile_codes': self.tile_codes, 'tile_order': self.tile_order
+        }
+
+    def _restore(self, arrays):
+        super()._restore(arrays)
+        for name in ('ids', 'water_levels', 'scarcity_codes', 'tile_codes', 'tile_order'):
+            setattr(self, name, arrays[name])
+
+    def nearest_wells(self, lats, lons):
+        """Nearest well of every coordinate, as a dict of arrays aligned with the input.
+
+        Keys are ``found``, ``id``, ``latitude``, ``longitude``, ``distance_km``,
+        ``water_level`` and ``scarcity_level``. Rows with invalid coordinates,
+        or when there is no data, have ``found`` False and no well.
+        """
+        lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+        lons = np.asarray(lons, dtype=np.float64).reshape(-1)
+        if lats.shape != lons.shape:
+            raise ValueError('Latitudes and longitudes differ in length')
+        with np.errstate(invalid='ignore'):
+            valid = (np.abs(lats) <= 90) & (np.abs(lons) <= 180)
+        positions = np.full(len(lats), -1, dtype=np.int64)
+        distances = np.full(len(lats), np.inf)
+
+        # Neighbouring coordinates walk the same part of the tree, so query in spatial order
+        pending = np.flatnonzero(valid)
+        pending = pending[np.lexsort((lons[pending], np.floor(lats[pending])))]
+        for start in range(0, len(pending), QUERY_BATCH):
+            batch = pending[start:start + QUERY_BATCH]
+            batch_distances, batch_positions = self.query(lats[batch], lons[batch], k=1)
+            distances[batch] = batch_distances[:, 0]
+            positions[batch] = batch_positions[:, 0]
+
+        found = positions >= 0
+        wells = positions[found]
+        water_levels = np.full(len(lats), np.nan)
+        water_levels[found] = self.water_levels[wells]
+        result = {
+            'found': found,
+            'id': np.full(len(lats), -1, dtype=np.int64),
+            'latitude': np.full(len(lats), np.nan),
+            'longitude': np.full(len(lats), np.nan),
+            'distance_km': np.where(found, distances, np.nan),
+            'water_level': water_levels,
+            'scarcity_level': scarcity_levels(water_levels)
+        }
+        result['id'][found] = self.ids[wells]
+        result['latitude'][found] = self.latitudes[wells]
+        result['longitude'][found] = self.longitudes[wells]
+        return result
+
+    def point(self, position):
+        return WaterLevelData(
+            id=int(self.ids[position]),
+            latitude=float(self.latitudes[position]),
+            longitude=float(self.longitudes[position]),
+            water_level=float(self.water_levels[position])
+        )
+
+def snapshot_path(generation):
+    return os.path.join(current_app.config['WATER_DATA_DIR'], f'water_levels.{generation}.snapshot')
+
+def database_id():
+    """Short hash identifying the database without writing its URL, which may hold a password, to disk."""
+    return hashlib.sha256(str(db.engine.url).encode()).hexdigest()[:16]
+
+_index_lock = threading.Lock()
+_index = None
+
+def get_spatial_index():
+    """Return the spatial index for the current data generation, rebuilding it when stale.
+
+    A new generation is mapped from its snapshot when one has been written,
+    which is instant and shares memory with other workers; otherwise the
+    index is loaded from the database into this process.
+    """
+    global _index
+    # Generations are numbered per database, so the database is part of the key
+    key = (str(db.engine.url), get_data_generation())
+    index = _index
+    if index is not None and index.key == key:
+        return index
+    with _index_lock:
+        if _index is None or _index.key != key:
+            index = WaterLevelIndex.open_snapshot(key[1])
+            if index is None:
+                index = WaterLevelIndex.load(key[1])
+            index.key = key
+            _index = index
+        return _index
+
+def invalidate_spatial_index():
+    """Drop this process's index; the next lookup reloads it from its snapshot or the database."""
+    global _index
+    with _index_lock:
+        _index = None
+
+def build_water_level_snapshot():
+    """Write the snapshot of the current data generation and switch this process to the mapped copy.
+
+    Returns the number of points.
+    """
+    index = get_spatial_index()
+    index.save_snapshot()
+    # Workers still on the previous generation may be reading its file
+    remove_stale_generations(current_app.config['WATER_DATA_DIR'], 'water_levels', keep={index.generation, index.generation - 1})
+    invalidate_spatial_index()
+    return len(index)
+
+def build_tile_cache():
+    """Compute every occupied map tile up to ``TILE_CACHE_ZOOM`` into the fragment cache.
+
+    With the SQLite cache backend the tiles are shared by every worker.
+    Returns the number of tiles.
+    """
+    index = get_spatial_index()
+    tiles = 0
+    for z in range(current_app.config['TILE_CACHE_ZOOM'] + 1):
+        for x, y in occupied_tiles(index, z):
+            fragment_cache.put(fragment_cache.tile_key(index.generation, z, x, y), tile_clusters(index, z, x, y))
+            tiles += 1
+    return tiles
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""Versioned binary snapshots of named arrays, memory-mapped read-only so processes share one copy."""
+import json
+import mmap
+import os
+import struct
+import tempfile
+import numpy as np
+
+MAGIC = b'WLSNAP'
+FORMAT_VERSION = 1
+# Magic, format version, header length; the JSON header and aligned arrays follow
+PREFIX = struct.Struct('<6sHI')
+ALIGNMENT = 64
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def write_snapshot(path, arrays, **meta):
+    """Write ``arrays`` (name -> ndarray) and JSON-able ``meta`` to ``path``.
+
+    The file is written next to ``path`` and renamed over it, so readers
+    see either the old snapshot or the complete new one.
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    entries = []
+    offset = 0
+    for name, array in arrays.items():
+        entries.append({'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset})
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({'meta': meta, 'arrays': entries}).encode()
+    data_start = _aligned(PREFIX.size + len(header))
+
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)) + header)
+            for entry, array in zip(entries, arrays.values()):
+                f.seek(data_start + entry['offset'])
+                f.write(array.tobytes())
+            f.truncate(data_start + offset)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def read_snapshot(path):
+    """Map the snapshot at ``path`` as ``(meta, arrays)``.
+
+    Arrays are read-only views of the mapping, so nothing is copied and the
+    pages are shared with every other process mapping the same file.
+    Returns None if the file is missing or from another format version.
+    """
+    try:
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+    magic, version, header_length = PREFIX.unpack_from(buffer)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        buffer.close()
+        return None
+    header = json.loads(buffer[PREFIX.size:PREFIX.size + header_length])
+    data_start = _aligned(PREFIX.size + header_length)
+    arrays = {}
+    for entry in header['arrays']:
+        count = int(np.prod(entry['shape'], dtype=np.int64))
+        array = np.frombuffer(buffer, dtype=entry['dtype'], count=count, offset=data_start + entry['offset'])
+        arrays[entry['name']] = array.reshape(entry['shape'])
+    return header['meta'], arrays
+
+def remove_stale_generations(directory, prefix, keep):
+    """Delete ``<prefix>.<generation>.*`` files in ``directory`` for generations not in ``keep``."""
+    for name in os.listdir(directory):
+        parts = name.split('.')
+        if parts[0] == prefix and len(parts) == 3 and parts[1].isdigit() and int(parts[1]) not in keep:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                # Still mapped by a process on a platform that refuses to delete it
+                pass
\ No newline at end of file
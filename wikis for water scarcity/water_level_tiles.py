@@ -0,0 +1,112 @@
+"""Clustered water level aggregates for web map tiles (XYZ, Web Mercator)."""
+import numpy as np
+from water_level_data import SCARCITY_LEVELS
+
+# Points are sorted by their Morton code at this zoom (cells of about 2m), so
+# every tile of a lower zoom is one contiguous run of the sorted codes
+CODE_ZOOM = 24
+# Clusters split each tile into 2**3 x 2**3 cells
+CLUSTER_ZOOM_OFFSET = 3
+MAX_ZOOM = CODE_ZOOM - CLUSTER_ZOOM_OFFSET
+MAX_MERCATOR_LATITUDE = 85.0511287798
+
+# Binary tile layout: the magic and cluster count, then one record per cluster
+BINARY_MAGIC = b'WLT1'
+BINARY_RECORD = np.dtype([
+    ('latitude', '<f4'), ('longitude', '<f4'), ('count', '<u4'),
+    ('min', '<f4'), ('mean', '<f4'), ('max', '<f4'), ('scarcity_level', 'u1')
+])
+
+def _spread_bits(values):
+    """Interleave zero bits between the low 32 bits of each value."""
+    values = values.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+def morton_codes(x, y):
+    return _spread_bits(np.asarray(x)) | (_spread_bits(np.asarray(y)) << np.uint64(1))
+
+def tile_coordinates(lats, lons, zoom=CODE_ZOOM):
+    """Integer XYZ tile column and row of each coordinate at ``zoom``."""
+    lats = np.radians(np.clip(np.asarray(lats, dtype=np.float64), -MAX_MERCATOR_LATITUDE, MAX_MERCATOR_LATITUDE))
+    lons = np.asarray(lons, dtype=np.float64)
+    tiles = 1 << zoom
+    x = np.floor((lons + 180) / 360 * tiles)
+    y = np.floor((1 - np.log(np.tan(lats) + 1 / np.cos(lats)) / np.pi) / 2 * tiles)
+    return np.clip(x, 0, tiles - 1).astype(np.uint64), np.clip(y, 0, tiles - 1).astype(np.uint64)
+
+def tile_order(lats, lons):
+    """Sorted Morton codes of the points and the positions that sort them."""
+    codes = morton_codes(*tile_coordinates(lats, lons))
+    order = np.argsort(codes, kind='stable')
+    return codes[order], order
+
+def tile_clusters(index, z, x, y):
+    """Aggregates of the points of tile ``z/x/y`` grouped into clusters.
+
+    ``index`` is a ``WaterLevelIndex``. Returns a dict of equal-length lists:
+    cluster centroid ``latitude``/``longitude``, ``count``, ``min``/``mean``/
+    ``max`` water level and the most common ``scarcity_level``.
+    """
+    shift = 2 * (CODE_ZOOM - z)
+    first = int(morton_codes(np.array([x]), np.array([y]))[0]) << shift
+    start, end = np.searchsorted(index.tile_codes, np.array([first, first + (1 << shift)], dtype=np.uint64))
+    if start == end:
+        return {name: [] for name in ('latitude', 'longitude', 'count', 'min', 'mean', 'max', 'scarcity_level')}
+
+    # Codes are sorted, so the points of each cluster cell are a contiguous run
+    cells = index.tile_codes[start:end] >> np.uint64(2 * (CODE_ZOOM - min(z + CLUSTER_ZOOM_OFFSET, CODE_ZOOM)))
+    starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+    counts = np.diff(np.r_[starts, len(cells)])
+    positions = index.tile_order[start:end]
+    levels = index.water_levels[positions]
+    classes = np.add.reduceat(np.eye(len(SCARCITY_LEVELS), dtype=np.int64)[index.scarcity_codes[positions]], starts)
+    return {
+        'latitude': (np.add.reduceat(index.latitudes[positions], starts) / counts).round(6).tolist(),
+        'longitude': (np.add.reduceat(index.longitudes[positions], starts) / counts).round(6).tolist(),
+        'count': counts.tolist(),
+        'min': np.minimum.reduceat(levels, starts).round(3).tolist(),
+        'mean': (np.add.reduceat(levels, starts) / counts).round(3).tolist(),
+        'max': np.maximum.reduceat(levels, starts).round(3).tolist(),
+        'scarcity_level': [SCARCITY_LEVELS[code] for code in classes.argmax(axis=1)]
+    }
+
+def occupied_tiles(index, z):
+    """``(x, y)`` of every tile at zoom ``z`` holding at least one point."""
+    tiles = np.unique(index.tile_codes >> np.uint64(2 * (CODE_ZOOM - z)))
+    # De-interleave the Morton code back into column and row
+    x = np.zeros(len(tiles), dtype=np.int64)
+    y = np.zeros(len(tiles), dtype=np.int64)
+    for bit in range(z):
+        x |= ((tiles >> np.uint64(2 * bit)) & np.uint64(1)).astype(np.int64) << bit
+        y |= ((tiles >> np.uint64(2 * bit + 1)) & np.uint64(1)).astype(np.int64) << bit
+    return list(zip(x.tolist(), y.tolist()))
+
+def clusters_geojson(clusters):
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+                'properties': {
+                    'count': count, 'min_water_level': low, 'mean_water_level': mean,
+                    'max_water_level': high, 'scarcity_level': level
+                }
+            }
+            for lat, lon, count, low, mean, high, level in zip(
+                clusters['latitude'], clusters['longitude'], clusters['count'],
+                clusters['min'], clusters['mean'], clusters['max'], clusters['scarcity_level']
+            )
+        ]
+    }
+
+def clusters_binary(clusters):
+    """``BINARY_MAGIC``, a little-endian uint32 cluster count and ``BINARY_RECORD`` records."""
+    records = np.zeros(len(clusters['count']), dtype=BINARY_RECORD)
+    for name in ('latitude', 'longitude', 'count', 'min', 'mean', 'max'):
+        records[name] = clusters[name]
+    records['scarcity_level'] = [SCARCITY_LEVELS.index(level) for level in clusters['scarcity_level']]
+    return BINARY_MAGIC + np.uint32(len(records)).astype('<u4').tobytes() + records.tobytes()
\ No newline at end of file
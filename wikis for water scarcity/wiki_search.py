@@ -0,0 +1,136 @@
+from database import db
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+import html
+import re
+
+FTS_TABLE = 'wiki_fts'
+
+# Relative bm25 weights of the indexed columns (title, content)
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+
+# URLs of databases known to have the full-text index
+_enabled_urls = set()
+
+def html_to_text(markup):
+    """Strip TinyMCE markup so tag and attribute names are not indexed."""
+    return html.unescape(re.sub(r'<[^>]+>', ' ', markup or ''))
+
+def match_expression(query):
+    """Turn free text into an FTS5 query matching every word as a prefix."""
+    words = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+def is_enabled(connection=None):
+    connection = connection or db.session.connection()
+    url = str(connection.engine.url)
+    if url in _enabled_urls:
+        return True
+    # The index is created by init_schema, usually in another process, so a
+    # missing index is looked for again on the next search
+    if _has_index(connection):
+        _enabled_urls.add(url)
+        return True
+    return False
+
+def _has_index(connection):
+    return connection.dialect.name == 'sqlite' and _has_fts_table(connection)
+
+def _has_fts_table(connection):
+    return connection.execute(
+        db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+    ).first() is not None
+
+def create_search_index():
+    """Create the FTS5 index for wikis if the database supports it.
+
+    The index is filled from the ``wiki`` table when it is first created.
+    Returns whether full-text search is available; without it ``search``
+    falls back to ``LIKE`` filters.
+    """
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return False
+    with engine.begin() as connection:
+        if not _has_fts_table(connection):
+            try:
+                connection.execute(db.text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                    f"title, content, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+                ))
+            except OperationalError:
+                return False  # SQLite built without FTS5
+            _rebuild(connection)
+    _enabled_urls.add(str(engine.url))
+    return True
+
+def rebuild_search_index():
+    """Re-index every wiki, e.g. after rows were changed outside the ORM."""
+    with db.engine.begin() as connection:
+        _rebuild(connection)
+
+def _rebuild(connection):
+    connection.execute(db.text(f'DELETE FROM {FTS_TABLE}'))
+    rows = connection.execute(db.text('SELECT id, title, content FROM wiki')).fetchall()
+    if rows:
+        connection.execute(
+            db.text(f'INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (:id, :title, :content)'),
+            [{'id': row.id, 'title': row.title, 'content': html_to_text(row.content)} for row in rows]
+        )
+
+def _index_wiki(connection, wiki):
+    connection.execute(db.text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), {'id': wiki.id})
+    connection.execute(
+        db.text(f'INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (:id, :title, :content)'),
+        {'id': wiki.id, 'title': wiki.title, 'content': html_to_text(wiki.content)}
+    )
+
+def register_search_index(model):
+    """Keep the index in sync with ``model`` inside the same flush/transaction.
+
+    Writes look the index up each time rather than trusting ``is_enabled``,
+    so none are missed once another process has created it.
+    """
+
+    @event.listens_for(model, 'after_insert')
+    def after_insert(mapper, connection, target):
+        if _has_index(connection):
+            _index_wiki(connection, target)
+
+    @event.listens_for(model, 'after_update')
+    def after_update(mapper, connection, target):
+        state = db.inspect(target)
+        changed = state.attrs.title.history.has_changes() or state.attrs.content.history.has_changes()
+        if changed and _has_index(connection):
+            _index_wiki(connection, target)
+
+    @event.listens_for(model, 'after_delete')
+    def after_delete(mapper, connection, target):
+        if _has_index(connection):
+            connection.execute(db.text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), {'id': target.id})
+
+def apply_text_search(query, model, text, listing_keys):
+    """Filter ``query`` to wikis matching ``text``, best matches first.
+
+    Returns the filtered query and the keyset ordering to paginate it by:
+    relevance then id when the full-text index is used, otherwise
+    ``listing_keys``.
+    """
+    expression = match_expression(text)
+    if expression and is_enabled():
+        fts = db.table(FTS_TABLE, db.column('rowid'))
+        rank = db.func.bm25(db.literal_column(FTS_TABLE), TITLE_WEIGHT, CONTENT_WEIGHT)
+        matches = db.session.query(fts.c.rowid.label('wiki_id'), rank.label('rank')) \
+            .filter(db.text(f'{FTS_TABLE} MATCH :match_expression').bindparams(match_expression=expression)) \
+            .subquery()
+        query = query.join(matches, matches.c.wiki_id == model.id)
+        return query, [('rank', matches.c.rank, False), ('id', model.id, True)]
+
+    query = query.filter(
+        db.or_(
+            model.title.ilike(f'%{text}%'),
+            model.content.ilike(f'%{text}%')
+        )
+    )
+    return query, listing_keys
\ No newline at end of file